@@ -0,0 +1,82 @@
+import os
+import threading
+from datetime import datetime, timezone
+from state_store import state_path, load_json, save_json
+
+
+class ConversationContextCache:
+    """Short summaries of the messages already analyzed in each conversation
+
+    Replies are analyzed from their newest message only; the earlier messages of the
+    thread are represented by these summaries and a truncated quote instead of the
+    whole quoted chain, so the prompt size per reply stays bounded however long the
+    thread grows.
+    Persisted in state/conversation_context.json, least recently updated
+    conversations are dropped beyond max_conversations.
+    """
+
+    def __init__(self, cache_file=None, max_entries=None, summary_chars=None, max_conversations=None):
+        if max_entries is None:
+            max_entries = int(os.getenv('EMAIL_CONTEXT_MAX_ENTRIES', '5'))
+        if summary_chars is None:
+            summary_chars = int(os.getenv('EMAIL_CONTEXT_SUMMARY_CHARS', '300'))
+        if max_conversations is None:
+            max_conversations = int(os.getenv('EMAIL_CONTEXT_MAX_CONVERSATIONS', '1000'))
+        self.cache_file = cache_file or state_path('conversation_context.json')
+        self.max_entries = max_entries
+        self.summary_chars = summary_chars
+        self.max_conversations = max_conversations
+        self.conversations = load_json(self.cache_file, {})
+        self._lock = threading.Lock()
+        
+        # Monitoring counters
+        self.hits = 0
+        self.misses = 0
+    
+    def summarize(self, email, newest_text, structured_todos):
+        """One-line digest of a message: sender, date, opening text and extracted actions"""
+        sender = (email.get('from') or {}).get('emailAddress', {}).get('name') or 'Unknown sender'
+        received = (email.get('receivedDateTime') or '')[:10]
+        text = ' '.join(newest_text.split())
+        if len(text) > self.summary_chars:
+            text = text[:self.summary_chars].rstrip() + '...'
+        summary = f"{received} {sender}: {text}"
+        if structured_todos:
+            summary += " | Action items: " + '; '.join(todo['action'] for todo in structured_todos)
+        return summary
+    
+    def get_context(self, conversation_id):
+        """Summaries of earlier messages in a conversation, oldest first, or None"""
+        if not conversation_id:
+            return None
+        with self._lock:
+            entry = self.conversations.get(conversation_id)
+            if not entry:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return list(entry['summaries'])
+    
+    def record(self, email, newest_text, structured_todos):
+        """Remember an analyzed message so later replies can refer to it"""
+        conversation_id = email.get('conversationId')
+        if not conversation_id:
+            return
+        summary = self.summarize(email, newest_text, structured_todos)
+        with self._lock:
+            entry = self.conversations.pop(conversation_id, {'summaries': []})
+            entry['summaries'] = (entry['summaries'] + [summary])[-self.max_entries:]
+            entry['updated'] = datetime.now(timezone.utc).isoformat()
+            
+            # Dicts keep insertion order - re-inserting moves the conversation to the end
+            self.conversations[conversation_id] = entry
+            while len(self.conversations) > self.max_conversations:
+                del self.conversations[next(iter(self.conversations))]
+            save_json(self.cache_file, self.conversations)
+    
+    def stats(self):
+        return {
+            'conversations': len(self.conversations),
+            'hits': self.hits,
+            'misses': self.misses
+        }
@@ -1,33 +1,199 @@
 import os
 import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
-import msal
 import requests
 import anthropic
 from todo_manager import TodoManager
-from microsoft_todo_manager import MicrosoftTodoManager
+from microsoft_todo_manager import MicrosoftTodoManager, StreamedTodoBatch
+from ledger import get_ledger
+from pre_classifier import ActionabilityClassifier
+from filter_rules import FilterRuleEngine
+from html_text import email_text, email_reply_parts
+from conversation_context import ConversationContextCache
+from extraction_cache import ExtractionCache, content_key
+from stream_parser import ActionItemStreamParser
+from model_router import ModelRouter, COMPLEXITY_LEVELS
+from http_client import get_http_client
+from graph_auth import get_token_provider
+from rate_limit import get_rate_limiter
 
 load_dotenv()
 
+# Fields requested for every message, shared by the window and delta queries
+MESSAGE_SELECT = 'id,conversationId,subject,from,bodyPreview,body,receivedDateTime,isRead'
+
+# Static extraction instructions, sent as a cacheable system prompt so only the
+# per-email fields are reprocessed on each call
+EMAIL_SYSTEM_PROMPT = """You are {user_email} analyzing an email sent TO you. Extract action items for YOU to do.
+
+IMPORTANT: This may be an email chain/thread. Focus on the LATEST/NEWEST message at the top, but use the older messages below for context to understand what's being discussed.
+
+Instructions:
+Extract action items for YOU ({user_email}) from the NEWEST/LATEST message only.
+Use the older messages for context only - DO NOT extract action items from older parts of the email chain.
+Remember: YOU are {user_email}, so don't refer to yourself in third person.
+
+Look for action items:
+
+1. ACTION ITEMS (things I need to do) - FROM THE LATEST MESSAGE ONLY:
+ONLY extract action items that require SIGNIFICANT effort or are BUSINESS-CRITICAL.
+
+DO extract:
+- Direct requests or tasks assigned to me that require substantial work
+- Important decisions I need to make that affect business outcomes
+- Follow-ups with high business impact or urgency
+- Information I need to provide that requires research or preparation
+- Important people I should contact for business purposes
+
+DO NOT extract routine/trivial tasks like:
+- Joining scheduled calls/meetings (that's just calendar management)
+- Clicking links to view content (too trivial)
+- Simple acknowledgments or "thanks" replies
+- Routine meeting preparations unless specifically complex
+- Basic calendar scheduling or rescheduling
+- spam/marketing messages
+
+2. KEY NOTES (important context to remember) - CAN BE FROM ANY MESSAGE IN THE CHAIN:
+- Important opinions or feedback shared (from any message)
+- Key concerns or risks mentioned (from any message)
+- Financial details or numbers (from any message)
+- Decisions made or positions taken (from any message)
+- Important dates or deadlines (from any message)
+- Context that helps understand the current situation
+
+BE SELECTIVE about action items - only extract items that require significant effort, planning, or have business impact.
+Yet, it's still better to add a trivial task than to miss something on the todo list.
+
+IMPORTANT: Keep action items SHORT and ACTION-ORIENTED (like "Call John about...", "Review contract terms ...", "Send proposal about ...").
+Each action item should include its specific details/context.
+
+Format your response as JSON EXACTLY like this:
+
+{{
+  "action_items": [
+    {{
+      "action": "Concise action description",
+      "details": "Specific context, who, what, when, why details"
+    }}
+  ]
+}}
+
+If there are no action items, return: {{"action_items": []}}"""
+
+FORWARDED_EMAIL_SYSTEM_PROMPT = """You are {user_email} analyzing an email sent TO you. Extract action items for YOU to do.
+
+IMPORTANT: This may be an email chain/thread. Focus on the LATEST/NEWEST message at the top, but use the older messages below for context to understand what's being discussed.
+
+Instructions:
+Extract action items for YOU ({user_email}) from the NEWEST/LATEST message only.
+Use the older messages for context only - DO NOT extract action items from older parts of the email chain.
+Remember: YOU are {user_email}, so don't refer to yourself in third person.
+
+Look for action items:
+
+1. ACTION ITEMS (things I need to do) - FROM THE LATEST MESSAGE ONLY:
+ONLY extract action items that require SIGNIFICANT effort or are BUSINESS-CRITICAL.
+
+DO extract:
+- Direct requests or tasks assigned to me that require substantial work
+- Important decisions I need to make that affect business outcomes
+- Follow-ups with high business impact or urgency
+- Information I need to provide that requires research or preparation
+- Important people I should contact for business purposes
+
+DO NOT extract routine/trivial tasks like:
+- Joining scheduled calls/meetings (that's just calendar management)
+- Clicking links to view content (too trivial)
+- Simple acknowledgments or "thanks" replies
+- Routine meeting preparations unless specifically complex
+- Basic calendar scheduling or rescheduling
+
+2. KEY NOTES (important context to remember) - CAN BE FROM ANY MESSAGE IN THE CHAIN:
+- Important opinions or feedback shared (from any message)
+- Key concerns or risks mentioned (from any message)
+- Financial details or numbers (from any message)
+- Decisions made or positions taken (from any message)
+- Important dates or deadlines (from any message)
+- Context that helps understand the current situation
+
+BE SELECTIVE about action items - only extract items that require significant effort, planning, or have business impact.
+It's better to miss trivial tasks than to clutter the todo list with routine activities.
+This is a forwarded email, so pay attention to the forwarded content for context.
+
+IMPORTANT: Keep action items SHORT and ACTION-ORIENTED (like "Call John", "Review contract", "Send proposal").
+Each action item should include its specific details/context.
+
+Format your response as JSON EXACTLY like this:
+
+{{
+  "action_items": [
+    {{
+      "action": "Concise action description",
+      "details": "Specific context, who, what, when, why details"
+    }}
+  ]
+}}
+
+If there are no action items, return: {{"action_items": []}}"""
+
+# Response format for the triage model - replaces the format section of the prompts above
+TRIAGE_RESPONSE_FORMAT = """First classify the email:
+- "none": nothing for you to do
+- "simple": a short message with explicit requests you can extract with confidence
+- "complex": a long or ambiguous thread, implied commitments, several people involved, or anything you are unsure about
+
+Format your response as JSON EXACTLY like this:
+
+{
+  "complexity": "none" | "simple" | "complex",
+  "action_items": [
+    {
+      "action": "Concise action description",
+      "details": "Specific context, who, what, when, why details"
+    }
+  ]
+}
+
+Only fill action_items when complexity is "simple" - otherwise return an empty list."""
+
+
+def usage_tokens(usage):
+    """Total tokens billed for a call, including prompt cache reads and writes"""
+    if usage is None:
+        return 0
+    return (usage.input_tokens + usage.output_tokens
+            + (getattr(usage, 'cache_read_input_tokens', 0) or 0)
+            + (getattr(usage, 'cache_creation_input_tokens', 0) or 0))
+
+
+def parse_received_time(received_str):
+    """Timezone-aware datetime from a Graph receivedDateTime string"""
+    if received_str.endswith('Z'):
+        return datetime.fromisoformat(received_str[:-1] + '+00:00')
+    return datetime.fromisoformat(received_str)
+
+
+def triage_prompt(system_prompt):
+    """Triage variant of an extraction prompt: same instructions, classification response format"""
+    return system_prompt.split("Format your response as JSON EXACTLY like this:")[0] + TRIAGE_RESPONSE_FORMAT
+
+
 class EmailMonitor:
-    def __init__(self):
-        self.client_id = os.getenv('CLIENT_ID')
-        self.client_secret = os.getenv('CLIENT_SECRET')
-        self.tenant_id = os.getenv('TENANT_ID')
+    def __init__(self, http_client=None, token_provider=None, ledger=None):
         self.user_email = os.getenv('USER_EMAIL')
         self.claude_api_key = os.getenv('ANTHROPIC_API_KEY')
         
-        self.authority = f"https://login.microsoftonline.com/{self.tenant_id}"
-        self.scope = ["https://graph.microsoft.com/.default"]
         self.graph_url = "https://graph.microsoft.com/v1.0"
         
-        # Initialize MSAL app
-        self.app = msal.ConfidentialClientApplication(
-            self.client_id,
-            authority=self.authority,
-            client_credential=self.client_secret
-        )
+        # Shared pooled HTTP transport for Graph calls
+        self.http = http_client or get_http_client()
+        
+        # Shared Graph token cache - avoids an MSAL round trip per request
+        self.token_provider = token_provider or get_token_provider()
         
         # Initialize Claude client
         if self.claude_api_key:
@@ -35,31 +201,108 @@ class EmailMonitor:
         else:
             self.claude_client = None
         
-        # Track last check time - timezone aware
-        self.last_check = datetime.now(timezone.utc) - timedelta(minutes=5)
+        # Extraction instructions for this mailbox, identical on every call so they stay cached
+        self.email_system_prompt = EMAIL_SYSTEM_PROMPT.format(user_email=self.user_email)
+        self.forwarded_system_prompt = FORWARDED_EMAIL_SYSTEM_PROMPT.format(user_email=self.user_email)
+        
+        # Emails analyzed concurrently per poll, and the shared Anthropic rate-limit gate
+        self.analysis_workers = max(1, int(os.getenv('EMAIL_ANALYSIS_WORKERS', '4')))
+        self.rate_limiter = get_rate_limiter()
+        
+        # Polls and push notifications may commit at the same time - sinks are written one email at a time
+        self._commit_lock = threading.Lock()
+        # Both threads also save the sync checkpoints, which must be written as a pair
+        self._checkpoint_lock = threading.Lock()
+        
+        # Durable ledger of processed message IDs and sync checkpoints
+        self.ledger = ledger or get_ledger()
+        
+        # Track last check time - timezone aware, resumed from the ledger after a restart
+        last_check = self.ledger.get_checkpoint('email_last_check')
+        if last_check:
+            self.last_check = datetime.fromisoformat(last_check)
+        else:
+            self.last_check = datetime.now(timezone.utc) - timedelta(minutes=5)
+        
+        # Sync mode: 'delta' asks Graph only for changes since the last poll,
+        # 'window' re-queries the last minute on every poll
+        self.sync_mode = os.getenv('EMAIL_SYNC_MODE', 'delta').lower()
+        self.delta_link = self.ledger.get_checkpoint('email_delta_link')
+        
+        # Messages claimed before a crash but never saved - processed again on the first poll
+        # (later polls pick up claims that time out, see ProcessedLedger.claim_timeout)
+        self.recovered_message_ids = self.ledger.recover_pending('email')
+        
+        # Paging - emails are fetched one page at a time and handed over as they arrive
+        self.page_size = int(os.getenv('EMAIL_PAGE_SIZE', '50'))
+        self.max_emails_per_poll = int(os.getenv('EMAIL_MAX_PER_POLL', '500'))
+        # Window mode: where the next poll starts when this one stopped at the limit,
+        # and whether the listing failed (the next poll then covers the same window again)
+        self.window_resume_from = None
+        self.window_fetch_failed = False
         
         # Initialize todo managers
         self.todo_manager = TodoManager()  # Keep for backward compatibility
-        self.ms_todo_manager = MicrosoftTodoManager()  # New Microsoft To Do integration
+        self.ms_todo_manager = MicrosoftTodoManager(http_client=self.http, token_provider=self.token_provider)  # New Microsoft To Do integration
+        
+        # Sender/domain/subject/header skip rules, compiled once (FILTER_RULES_FILE)
+        self.filter_rules = FilterRuleEngine()
+        # Message headers are large, so they are only fetched when a rule looks at them
+        self.message_select = MESSAGE_SELECT
+        if self.filter_rules.uses_headers:
+            self.message_select += ',internetMessageHeaders'
+        
+        # Local scoring stage that keeps clearly non-actionable mail away from Claude
+        decisions_file = os.path.join(os.path.dirname(self.todo_manager.todo_file), 'structured_todos', 'decisions.jsonl')
+        self.pre_classifier = ActionabilityClassifier(decisions_file)
+        
+        # Replies are analyzed from their newest message; earlier messages come from
+        # per-conversation summaries plus a truncated quote
+        self.conversation_context = ConversationContextCache()
+        self.quoted_context_chars = int(os.getenv('EMAIL_QUOTED_CONTEXT_CHARS', '1500'))
+        
+        # Extraction results by content hash - duplicates and resends skip Claude
+        self.extraction_cache = ExtractionCache()
+        
+        # Stream Claude's answer and send each action item to To Do as soon as it is parsed
+        self.streaming = os.getenv('EMAIL_STREAMING', 'true').lower() == 'true'
+        
+        # Small triage model first, escalation model only for complex or long emails
+        self.router = ModelRouter()
+        self.triage_prompts = {
+            'email': triage_prompt(self.email_system_prompt),
+            'forwarded': triage_prompt(self.forwarded_system_prompt)
+        }
         
     def get_access_token(self):
         """Get access token for Graph API"""
-        result = self.app.acquire_token_silent(self.scope, account=None)
-        if not result:
-            result = self.app.acquire_token_for_client(scopes=self.scope)
-        
-        if "access_token" in result:
-            return result['access_token']
-        else:
-            print(f"Error getting token: {result.get('error')}")
-            print(f"Description: {result.get('error_description')}")
-            return None
+        return self.token_provider.get_token()
     
     def get_recent_emails(self, minutes_back=5):
         """Fetch emails from the last X minutes"""
+        return list(self.iter_recent_emails(minutes_back))
+    
+    def iter_graph_pages(self, url, params=None, headers=None):
+        """Yield pages of a Graph collection, following @odata.nextLink lazily"""
+        while url:
+            response = self.http.get(url, headers=headers, params=params)
+            response.raise_for_status()
+            data = response.json()
+            yield data
+            
+            # nextLink already carries the query, so params are only sent once
+            params = None
+            url = data.get('@odata.nextLink')
+    
+    def iter_recent_emails(self, minutes_back=5, since=None):
+        """Yield emails from the last X minutes (or received since a time) one by one, fetching pages as needed
+        
+        Sets window_fetch_failed if the listing could not be fetched in full.
+        """
         token = self.get_access_token()
         if not token:
-            return []
+            self.window_fetch_failed = True
+            return
         
         headers = {
             'Authorization': f'Bearer {token}',
@@ -67,193 +310,381 @@ class EmailMonitor:
         }
         
         # Calculate time filter - using UTC
-        from datetime import timezone
-        time_filter = (datetime.now(timezone.utc) - timedelta(minutes=minutes_back)).strftime('%Y-%m-%dT%H:%M:%SZ')
+        if since is None:
+            since = datetime.now(timezone.utc) - timedelta(minutes=minutes_back)
+        time_filter = since.strftime('%Y-%m-%dT%H:%M:%SZ')
         
         # Build query
         endpoint = f"{self.graph_url}/users/{self.user_email}/messages"
         params = {
             '$filter': f"receivedDateTime ge {time_filter}",
-            '$select': 'id,subject,from,bodyPreview,body,receivedDateTime,isRead',
-            '$orderby': 'receivedDateTime desc',
-            '$top': 50
+            '$select': self.message_select,
+            '$orderby': 'receivedDateTime asc',
+            '$top': self.page_size
         }
         
+        count = 0
         try:
-            response = requests.get(endpoint, headers=headers, params=params)
-            response.raise_for_status()
-            
-            emails = response.json().get('value', [])
-            return emails
+            for page in self.iter_graph_pages(endpoint, params, headers):
+                for email in page.get('value', []):
+                    yield email
+                    count += 1
+                
+                if count >= self.max_emails_per_poll and page.get('@odata.nextLink') and page.get('value'):
+                    # Results are oldest first - the next poll resumes from the last email handled
+                    # (a second early, since emails received in the same second may be unread; the
+                    # ledger skips the ones already done)
+                    last_received = parse_received_time(page['value'][-1]['receivedDateTime'])
+                    self.window_resume_from = last_received - timedelta(seconds=1)
+                    print(f"Reached limit of {self.max_emails_per_poll} emails for this poll, resuming next poll")
+                    return
             
         except requests.exceptions.RequestException as e:
             print(f"Error fetching emails: {e}")
-            return []
+            self.window_fetch_failed = True
     
-    def is_actionable_email(self, email):
-        """Basic filter to skip obvious spam/newsletters and meeting responses"""
-        subject = email.get('subject', '').lower()
+    def save_checkpoints(self):
+        """Persist the delta link and last check time in the ledger - safe to call from any thread"""
+        with self._checkpoint_lock:
+            self.ledger.set_checkpoint('email_delta_link', self.delta_link)
+            self.ledger.set_checkpoint('email_last_check', self.last_check.isoformat())
+    
+    def get_email_changes(self):
+        """Fetch messages added or changed in the inbox since the last delta sync"""
+        return list(self.iter_email_changes())
+    
+    def iter_email_changes(self):
+        """Yield messages added or changed in the inbox since the last delta sync"""
+        token = self.get_access_token()
+        if not token:
+            return
         
-        # Skip meeting responses and calendar items
-        if subject.startswith(('accepted:', 'declined:', 'tentative:', 'canceled:', 'updated:')):
-            return False
+        headers = {
+            'Authorization': f'Bearer {token}',
+            'Content-Type': 'application/json',
+            'Prefer': f'odata.maxpagesize={self.page_size}'
+        }
+        
+        if self.delta_link:
+            url = self.delta_link
+            params = None
+        else:
+            # First sync - only pick up mail from the last few minutes, like the window mode
+            print("Starting new mailbox delta sync...")
+            time_filter = self.last_check.strftime('%Y-%m-%dT%H:%M:%SZ')
+            url = f"{self.graph_url}/users/{self.user_email}/mailFolders/inbox/messages/delta"
+            params = {
+                '$filter': f"receivedDateTime ge {time_filter}",
+                '$select': self.message_select
+            }
         
+        count = 0
+        try:
+            for page in self.iter_graph_pages(url, params, headers):
+                for item in page.get('value', []):
+                    # Skip deletions and moves out of the inbox
+                    if '@removed' not in item:
+                        yield item
+                        count += 1
+                
+                if page.get('@odata.deltaLink'):
+                    self.delta_link = page['@odata.deltaLink']
+                elif count >= self.max_emails_per_poll:
+                    # A delta nextLink can be resumed later, so the rest is picked up next poll
+                    print(f"Reached limit of {self.max_emails_per_poll} emails for this poll, resuming next poll")
+                    self.delta_link = page.get('@odata.nextLink')
+                    break
+            
+            self.save_checkpoints()
+            
+        except requests.exceptions.HTTPError as e:
+            # Graph drops sync state after a while - start over from a fresh sync
+            if e.response is not None and e.response.status_code == 410 and self.delta_link:
+                print("Delta token expired, restarting mailbox sync")
+                self.delta_link = None
+                self.save_checkpoints()
+                yield from self.iter_email_changes()
+            else:
+                print(f"Error fetching email changes: {e}")
+        except requests.exceptions.RequestException as e:
+            print(f"Error fetching email changes: {e}")
+    
+    def is_actionable_email(self, email):
+        """Basic filter to skip obvious spam/newsletters and meeting responses"""
         # Skip outbound emails (emails FROM the monitored user)
         if 'from' in email:
             sender = email.get('from', {}).get('emailAddress', {}).get('address', '').lower()
             if sender == self.user_email.lower():
                 print(f"Skipping outbound email from {sender} (user's own email)")
                 return False
-        else:
-            sender = ''
-        
-        # Skip patterns
-        skip_patterns = [
-            'unsubscribe',
-            'newsletter',
-            'no-reply',
-            'noreply',
-            'notification',
-            'alert@',
-            'updates@',
-            'marketing',
-            'promo',
-            'out of office',
-            'automatic reply'
-        ]
-        
-        for pattern in skip_patterns:
-            if pattern in subject or (sender and pattern in sender):
-                return False
         
-        # Skip emails with no meaningful content
-        body = email.get('body', {}).get('content', '')
-        body_preview = email.get('bodyPreview', '')
-        
-        # Check if email has any actual text content (not just HTML/whitespace)
-        import re
-        text_content = re.sub(r'<[^>]+>', '', body)  # Strip HTML
-        text_content = text_content.strip()
+        # Skip meeting responses, newsletters, notifications etc. - one compiled match per field
+        if self.filter_rules.match(email):
+            return False
         
-        if not text_content and not body_preview:
+        # Skip emails with no meaningful content (not just HTML/whitespace)
+        if not email_text(email) and not email.get('bodyPreview'):
             return False
             
         return True
     
+    def claude_messages_api(self):
+        """Messages API that accepts cache_control - anthropic 0.34 only has it in the prompt caching beta"""
+        beta = getattr(self.claude_client, 'beta', None)
+        if beta is not None and hasattr(beta, 'prompt_caching'):
+            return beta.prompt_caching.messages
+        return self.claude_client.messages
+    
+    def cached_system(self, system_prompt):
+        """System prompt block marked for prompt caching
+        
+        The instructions (roughly 600 tokens) are below the shortest prefix Anthropic
+        caches (1024 tokens, 2048 on Haiku), so today the breakpoint is ignored at no
+        cost - it takes effect if the instructions grow past the minimum.
+        """
+        return [{
+            "type": "text",
+            "text": system_prompt,
+            "cache_control": {"type": "ephemeral"}
+        }]
+    
+    def log_usage(self, usage):
+        print(f"Claude tokens: input={usage.input_tokens}, "
+              f"cache_read={getattr(usage, 'cache_read_input_tokens', 0) or 0}, "
+              f"cache_write={getattr(usage, 'cache_creation_input_tokens', 0) or 0}, "
+              f"output={usage.output_tokens}")
+    
+    def create_claude_message(self, system_prompt, content, model=None, max_tokens=2000):
+        """Call Claude with the static instructions as a cached system prompt"""
+        system = self.cached_system(system_prompt)
+        messages_api = self.claude_messages_api()
+        
+        # Raw responses expose the rate-limit headers the worker pool paces itself with
+        for attempt in range(3):
+            self.rate_limiter.wait()
+            try:
+                raw_response = messages_api.with_raw_response.create(
+                    model=model or self.router.escalation_model,
+                    max_tokens=max_tokens,
+                    system=system,
+                    messages=[{"role": "user", "content": content}]
+                )
+                break
+            except anthropic.RateLimitError as e:
+                self.rate_limiter.throttle(e.response.headers)
+                if attempt == 2:
+                    raise
+        
+        self.rate_limiter.update(raw_response.headers)
+        response = raw_response.parse()
+        
+        self.log_usage(response.usage)
+        
+        return response
+    
+    def stream_action_items(self, system_prompt, content, on_item=None, model=None):
+        """Stream Claude's answer, parsing action items as they arrive
+        
+        on_item is called with each item as soon as it is complete. Returns
+        (action_items, usage, complete); complete is False when the action_items
+        array was never closed - the output was cut off or malformed, or the stream
+        failed after some items, which are still returned.
+        """
+        system = self.cached_system(system_prompt)
+        messages_api = self.claude_messages_api()
+        
+        for attempt in range(3):
+            self.rate_limiter.wait()
+            parser = ActionItemStreamParser()
+            try:
+                with messages_api.stream(
+                    model=model or self.router.escalation_model,
+                    max_tokens=2000,
+                    system=system,
+                    messages=[{"role": "user", "content": content}]
+                ) as stream:
+                    self.rate_limiter.update(stream.response.headers)
+                    try:
+                        for text in stream.text_stream:
+                            for item in parser.feed(text):
+                                if on_item:
+                                    on_item(item)
+                        message = stream.get_final_message()
+                    except Exception as e:
+                        if not parser.items:
+                            raise
+                        print(f"ERROR in Claude stream after {len(parser.items)} action item(s), keeping them: {e}")
+                        return parser.items, None, False
+                break
+            except anthropic.RateLimitError as e:
+                self.rate_limiter.throttle(e.response.headers)
+                if attempt == 2:
+                    raise
+        
+        self.log_usage(message.usage)
+        
+        # No action_items array in the stream - fall back to parsing the whole answer
+        if not parser.started:
+            text = ''.join(block.text for block in message.content if getattr(block, 'text', None))
+            return self.parse_action_items(text.strip()), message.usage, True
+        
+        # Only a closed action_items array is the whole answer
+        if not parser.finished:
+            reason = "truncated" if message.stop_reason == 'max_tokens' else "malformed"
+            print(f"WARNING: Claude output was {reason}, keeping {len(parser.items)} complete action item(s)")
+        return parser.items, message.usage, parser.finished
+    
+    def parse_action_items(self, result):
+        """Parse the action_items list out of Claude's JSON response"""
+        import json
+        # Extract just the JSON part (Claude sometimes adds extra text after)
+        json_start = result.find('{')
+        json_end = result.rfind('}') + 1
+        if json_start != -1 and json_end != 0:
+            json_text = result[json_start:json_end]
+            data = json.loads(json_text)
+        else:
+            data = json.loads(result)  # Fallback to original
+        return data.get('action_items', [])
+    
+    def extract_action_items(self, kind, system_prompt, content, email, on_item=None):
+        """Action items for an email, from the extraction cache or a Claude call
+        
+        When streaming, on_item receives each item as soon as Claude has produced it.
+        """
+        sender = (email.get('from') or {}).get('emailAddress', {}).get('address', '')
+        cache_key = content_key(kind, sender, email.get('subject'), email_text(email))
+        action_items = self.extraction_cache.get(cache_key)
+        if action_items is not None:
+            print(f"Extraction cache hit - reusing {len(action_items)} action item(s)")
+            return action_items
+        
+        tokens = 0
+        if self.router.should_triage(content):
+            complexity, action_items, usage = self.triage_email(kind, content)
+            tokens += usage_tokens(usage)
+            if complexity in ('none', 'simple'):
+                # Already complete - uploaded with the rest of the email's todos in one batch
+                self.extraction_cache.put(cache_key, action_items, tokens)
+                return action_items
+            print(f"Escalating to {self.router.escalation_model} ({complexity or 'triage failed'})")
+        
+        started = time.monotonic()
+        if self.streaming:
+            action_items, usage, complete = self.stream_action_items(system_prompt, content, on_item)
+        else:
+            response = self.create_claude_message(system_prompt, content)
+            result = response.content[0].text.strip()
+            action_items, usage, complete = self.parse_action_items(result), response.usage, True
+        self.router.record('escalation', time.monotonic() - started, usage)
+        
+        # Partial results are used, but never cached
+        if complete:
+            tokens += usage_tokens(usage)
+            self.extraction_cache.put(cache_key, action_items, tokens)
+        return action_items
+    
+    def triage_email(self, kind, content):
+        """Classify an email with the triage model, extracting simple ones on the spot
+        
+        Returns (complexity, action_items, usage); complexity is None when the
+        triage call failed or its answer could not be parsed.
+        """
+        import json
+        started = time.monotonic()
+        usage = None
+        try:
+            response = self.create_claude_message(self.triage_prompts[kind], content,
+                                                  model=self.router.triage_model, max_tokens=1000)
+            usage = response.usage
+            result = response.content[0].text.strip()
+            data = json.loads(result[result.find('{'):result.rfind('}') + 1])
+        except (anthropic.APIError, json.JSONDecodeError) as e:
+            print(f"ERROR in triage with {self.router.triage_model}: {e}")
+            data = {}
+        self.router.record('triage', time.monotonic() - started, usage)
+        
+        complexity = data.get('complexity')
+        if complexity not in COMPLEXITY_LEVELS:
+            self.router.count_decision('unparsed')
+            return None, [], usage
+        
+        self.router.count_decision(complexity)
+        action_items = [item for item in (data.get('action_items') or []) if isinstance(item, dict)] if complexity == 'simple' else []
+        print(f"Triage ({self.router.triage_model}): {complexity}, {len(action_items)} action item(s)")
+        return complexity, action_items, usage
+    
+    def build_structured_todo(self, item, email):
+        """Structured todo for one extracted action item, with the email's metadata"""
+        if 'from' in email:
+            metadata = {
+                'from': email['from']['emailAddress']['name'] + " <" + email['from']['emailAddress']['address'] + ">",
+                'subject': email['subject'],
+                'received_time': email['receivedDateTime'],
+                'source': 'email'
+            }
+        else:
+            metadata = {
+                'from': 'Unknown (Forwarded Email)',
+                'subject': email.get('subject', 'No subject'),
+                'received_time': email.get('receivedDateTime', 'Unknown'),
+                'source': 'forwarded_email'
+            }
+        return {
+            'action': item.get('action', ''),
+            'details': item.get('details', ''),
+            'email_metadata': metadata
+        }
+    
+    def stream_todo(self, item, email, batch):
+        """Queue an action item for To Do the moment it is parsed from the stream
+        
+        The batch uploads a few items at a time; anything it fails to upload is
+        left for the regular upload when the email is committed.
+        """
+        todo = self.build_structured_todo(item, email)
+        print(f"  ⚡ Streaming to Microsoft To Do: {todo['action']}")
+        batch.add(todo)
+        return todo
+    
     def analyze_email_with_claude_no_sender(self, email):
-        """Send email to Claude for todo analysis when sender is unknown"""
+        """Send email to Claude for todo analysis when sender is unknown
+        
+        Returns None when Claude could not be asked or its answer could not be parsed.
+        """
         if not self.claude_client:
             print("ERROR: Claude API key not configured")
-            return []
+            return None
         
         try:
-            # Get email body content
-            body = email.get('body', {}).get('content', '')
-            if not body:
-                body = email.get('bodyPreview', '')
-            
-            # Prepare the prompt for emails without sender
-            prompt = f"""
-            You are {self.user_email} analyzing an email sent TO you. Extract action items for YOU to do.
-            
-            IMPORTANT: This may be an email chain/thread. Focus on the LATEST/NEWEST message at the top, but use the older messages below for context to understand what's being discussed.
-            
-            Email Details:
-            From: Unknown (Forwarded Email)  
-            Subject: {email.get('subject', 'No subject')}
-            Recipient: {self.user_email} (YOU)
-            
-            Email Body (newest message first, older replies below):
-            {body}
-            
-            Instructions:
-            Extract action items for YOU ({self.user_email}) from the NEWEST/LATEST message only.
-            Use the older messages for context only - DO NOT extract action items from older parts of the email chain.
-            Remember: YOU are {self.user_email}, so don't refer to yourself in third person.
-            
-            Look for action items:
-            
-            1. ACTION ITEMS (things I need to do) - FROM THE LATEST MESSAGE ONLY:
-            ONLY extract action items that require SIGNIFICANT effort or are BUSINESS-CRITICAL.
-            
-            DO extract:
-            - Direct requests or tasks assigned to me that require substantial work
-            - Important decisions I need to make that affect business outcomes
-            - Follow-ups with high business impact or urgency
-            - Information I need to provide that requires research or preparation
-            - Important people I should contact for business purposes
-            
-            DO NOT extract routine/trivial tasks like:
-            - Joining scheduled calls/meetings (that's just calendar management)
-            - Clicking links to view content (too trivial)
-            - Simple acknowledgments or "thanks" replies
-            - Routine meeting preparations unless specifically complex
-            - Basic calendar scheduling or rescheduling
-            
-            2. KEY NOTES (important context to remember) - CAN BE FROM ANY MESSAGE IN THE CHAIN:
-            - Important opinions or feedback shared (from any message)
-            - Key concerns or risks mentioned (from any message)
-            - Financial details or numbers (from any message)
-            - Decisions made or positions taken (from any message)
-            - Important dates or deadlines (from any message)
-            - Context that helps understand the current situation
-            
-            BE SELECTIVE about action items - only extract items that require significant effort, planning, or have business impact. 
-            It's better to miss trivial tasks than to clutter the todo list with routine activities.
-            This is a forwarded email, so pay attention to the forwarded content for context.
-            
-            IMPORTANT: Keep action items SHORT and ACTION-ORIENTED (like "Call John", "Review contract", "Send proposal"). 
-            Each action item should include its specific details/context.
-            
-            Format your response as JSON EXACTLY like this:
+            # Plain text of the body - markup only costs tokens
+            body = email_text(email)
             
-            {{
-              "action_items": [
-                {{
-                  "action": "Concise action description",
-                  "details": "Specific context, who, what, when, why details"
-                }}
-              ]
-            }}
-            
-            If there are no action items, return: {{"action_items": []}}
-            """
-            
-            response = self.claude_client.messages.create(
-                model="claude-opus-4-20250514",
-                max_tokens=2000,
-                messages=[{"role": "user", "content": prompt}]
-            )
-            
-            result = response.content[0].text.strip()
+            # Only the per-email fields vary - the instructions live in the cached system prompt
+            content = f"""Email Details:
+From: Unknown (Forwarded Email)
+Subject: {email.get('subject', 'No subject')}
+Recipient: {self.user_email} (YOU)
+
+Email Body (newest message first, older replies below):
+{body}"""
             
             # Parse the JSON response
             try:
                 import json
-                # Extract just the JSON part (Claude sometimes adds extra text after)
-                json_start = result.find('{')
-                json_end = result.rfind('}') + 1
-                if json_start != -1 and json_end != 0:
-                    json_text = result[json_start:json_end]
-                    data = json.loads(json_text)
-                else:
-                    data = json.loads(result)  # Fallback to original
-                action_items = data.get('action_items', [])
+                # Items streamed mid-call are already in To Do - they come first, in order
+                streamed = []
+                on_item = None
+                if self.streaming:
+                    batch = StreamedTodoBatch(self.ms_todo_manager, "Email Tasks")
+                    on_item = lambda item: streamed.append(self.stream_todo(item, email, batch))
+                action_items = self.extract_action_items('forwarded', self.forwarded_system_prompt, content, email, on_item)
+                if on_item:
+                    batch.flush()
                 
                 # Convert to structured format with email metadata
-                structured_todos = []
-                for item in action_items:
-                    structured_todo = {
-                        'action': item.get('action', ''),
-                        'details': item.get('details', ''),
-                        'email_metadata': {
-                            'from': 'Unknown (Forwarded Email)',
-                            'subject': email.get('subject', 'No subject'),
-                            'received_time': email.get('receivedDateTime', 'Unknown'),
-                            'source': 'forwarded_email'
-                        }
-                    }
-                    structured_todos.append(structured_todo)
+                structured_todos = streamed + [self.build_structured_todo(item, email)
+                                               for item in action_items[len(streamed):]]
                 
                 # Print structured todos
                 if structured_todos:
@@ -267,127 +698,69 @@ class EmailMonitor:
                 
             except json.JSONDecodeError as e:
                 print(f"ERROR parsing JSON response: {e}")
-                print(f"Raw response: {result}")
-                return []
+                print(f"Raw response: {e.doc}")
+                return None
             
         except Exception as e:
             print(f"ERROR analyzing email with Claude: {e}")
-            return []
+            return None
+    
+    def build_reply_body(self, email):
+        """Prompt body for a reply: the newest message plus bounded thread context"""
+        newest, quoted = email_reply_parts(email)
+        
+        # Forwards carry their substance in the quoted part - send those whole
+        subject = (email.get('subject') or '').upper()
+        if not quoted or subject.startswith(('FW:', 'FWD:')):
+            return f"Email Body (newest message first, older replies below):\n{email_text(email)}"
+        
+        # Summaries only cover messages analyzed here - the quote (most recent first) still
+        # carries the user's own replies and messages that were filtered out
+        context = f"Earlier in this thread (quoted, truncated):\n{quoted[:self.quoted_context_chars]}"
+        summaries = self.conversation_context.get_context(email.get('conversationId'))
+        if summaries:
+            context = ("Earlier in this thread (summaries, oldest first):\n"
+                       + "\n".join(f"- {summary}" for summary in summaries) + f"\n\n{context}")
+        
+        return f"Newest message:\n{newest}\n\n{context}"
     
     def analyze_email_with_claude(self, email):
-        """Send email to Claude for todo analysis"""
+        """Send email to Claude for todo analysis
+        
+        Returns None when Claude could not be asked or its answer could not be parsed.
+        """
         if not self.claude_client:
             print("ERROR: Claude API key not configured")
-            return []
+            return None
         
         try:
-            # Get email body content
-            body = email.get('body', {}).get('content', '')
-            if not body:
-                body = email.get('bodyPreview', '')
-            
-            # Prepare the prompt
-            prompt = f"""
-            You are {self.user_email} analyzing an email sent TO you. Extract action items for YOU to do.
-            
-            IMPORTANT: This may be an email chain/thread. Focus on the LATEST/NEWEST message at the top, but use the older messages below for context to understand what's being discussed.
-            
-            Email Details:
-            From: {email['from']['emailAddress']['name']} <{email['from']['emailAddress']['address']}>
-            Subject: {email['subject']}
-            Recipient: {self.user_email} (YOU)
+            # Newest message plus a bounded summary of the thread, as plain text
+            body = self.build_reply_body(email)
             
-            Email Body (newest message first, older replies below):
-            {body}
-            
-            Instructions:
-            Extract action items for YOU ({self.user_email}) from the NEWEST/LATEST message only.
-            Use the older messages for context only - DO NOT extract action items from older parts of the email chain.
-            Remember: YOU are {self.user_email}, so don't refer to yourself in third person.
-            
-            Look for action items:
-            
-            1. ACTION ITEMS (things I need to do) - FROM THE LATEST MESSAGE ONLY:
-            ONLY extract action items that require SIGNIFICANT effort or are BUSINESS-CRITICAL. 
-            
-            DO extract:
-            - Direct requests or tasks assigned to me that require substantial work
-            - Important decisions I need to make that affect business outcomes
-            - Follow-ups with high business impact or urgency
-            - Information I need to provide that requires research or preparation
-            - Important people I should contact for business purposes
-            
-            DO NOT extract routine/trivial tasks like:
-            - Joining scheduled calls/meetings (that's just calendar management)
-            - Clicking links to view content (too trivial)
-            - Simple acknowledgments or "thanks" replies
-            - Routine meeting preparations unless specifically complex
-            - Basic calendar scheduling or rescheduling
-            - spam/marketing messages 
-            
-            2. KEY NOTES (important context to remember) - CAN BE FROM ANY MESSAGE IN THE CHAIN:
-            - Important opinions or feedback shared (from any message)
-            - Key concerns or risks mentioned (from any message)
-            - Financial details or numbers (from any message)
-            - Decisions made or positions taken (from any message)
-            - Important dates or deadlines (from any message)
-            - Context that helps understand the current situation
-            
-            BE SELECTIVE about action items - only extract items that require significant effort, planning, or have business impact. 
-            Yet, it's still better to add a trivial task than to miss something on the todo list.
+            # Only the per-email fields vary - the instructions live in the cached system prompt
+            content = f"""Email Details:
+From: {email['from']['emailAddress']['name']} <{email['from']['emailAddress']['address']}>
+Subject: {email['subject']}
+Recipient: {self.user_email} (YOU)
 
-            IMPORTANT: Keep action items SHORT and ACTION-ORIENTED (like "Call John about...", "Review contract terms ...", "Send proposal about ..."). 
-            Each action item should include its specific details/context.
-            
-            Format your response as JSON EXACTLY like this:
-            
-            {{
-              "action_items": [
-                {{
-                  "action": "Concise action description",
-                  "details": "Specific context, who, what, when, why details"
-                }}
-              ]
-            }}
-            
-            If there are no action items, return: {{"action_items": []}}
-            """
-            
-            response = self.claude_client.messages.create(
-                model="claude-opus-4-20250514",  # Use latest non-deprecated model
-                max_tokens=2000,
-                messages=[{"role": "user", "content": prompt}]
-            )
-            
-            result = response.content[0].text.strip()
+{body}"""
             
             # Parse the JSON response
             try:
                 import json
-                # Extract just the JSON part (Claude sometimes adds extra text after)
-                json_start = result.find('{')
-                json_end = result.rfind('}') + 1
-                if json_start != -1 and json_end != 0:
-                    json_text = result[json_start:json_end]
-                    data = json.loads(json_text)
-                else:
-                    data = json.loads(result)  # Fallback to original
-                action_items = data.get('action_items', [])
+                # Items streamed mid-call are already in To Do - they come first, in order
+                streamed = []
+                on_item = None
+                if self.streaming:
+                    batch = StreamedTodoBatch(self.ms_todo_manager, "Email Tasks")
+                    on_item = lambda item: streamed.append(self.stream_todo(item, email, batch))
+                action_items = self.extract_action_items('email', self.email_system_prompt, content, email, on_item)
+                if on_item:
+                    batch.flush()
                 
                 # Convert to structured format with email metadata
-                structured_todos = []
-                for item in action_items:
-                    structured_todo = {
-                        'action': item.get('action', ''),
-                        'details': item.get('details', ''),
-                        'email_metadata': {
-                            'from': email['from']['emailAddress']['name'] + " <" + email['from']['emailAddress']['address'] + ">",
-                            'subject': email['subject'],
-                            'received_time': email['receivedDateTime'],
-                            'source': 'email'
-                        }
-                    }
-                    structured_todos.append(structured_todo)
+                structured_todos = streamed + [self.build_structured_todo(item, email)
+                                               for item in action_items[len(streamed):]]
                 
                 # Print structured todos
                 if structured_todos:
@@ -401,29 +774,36 @@ class EmailMonitor:
                 
             except json.JSONDecodeError as e:
                 print(f"ERROR parsing JSON response: {e}")
-                print(f"Raw response: {result}")
-                return []
+                print(f"Raw response: {e.doc}")
+                return None
             
         except Exception as e:
             print(f"ERROR analyzing email with Claude: {e}")
-            return []
+            return None
     
-    def save_structured_todos(self, structured_todos):
+    def save_structured_todos(self, structured_todos, message_id=None):
         """Save structured todos to JSON file for future integrations"""
         if not structured_todos:
             return
             
         try:
+            import hashlib
             import json
             import os
+            import uuid
             
             # Create structured data directory if it doesn't exist
             structured_dir = os.path.join(os.path.dirname(self.todo_manager.todo_file), 'structured_todos')
             os.makedirs(structured_dir, exist_ok=True)
             
-            # Generate filename with timestamp
+            # Generate filename with timestamp - emails committed in the same second are told
+            # apart by their message ID (hashed, since Graph IDs contain '/' and '=')
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f"todos_{timestamp}.json"
+            if message_id:
+                suffix = hashlib.sha1(message_id.encode('utf-8')).hexdigest()[:12]
+            else:
+                suffix = uuid.uuid4().hex[:12]
+            filename = f"todos_{timestamp}_{suffix}.json"
             filepath = os.path.join(structured_dir, filename)
             
             # Save structured todos
@@ -435,159 +815,266 @@ class EmailMonitor:
         except Exception as e:
             print(f"ERROR saving structured todos: {e}")
     
-    def check_new_emails(self):
-        """Check for new emails and extract todos"""
-        print("Checking for new emails...")
+    def claim_message(self, message_id):
+        """Record a message as in progress; False if a poll or notification already took it"""
+        return self.ledger.claim('email', message_id)
+    
+    def is_new_email(self, email):
+        """Check whether an email has not been processed by an earlier poll"""
+        received_time = parse_received_time(email['receivedDateTime'])
         
-        # Get recent emails
-        emails = self.get_recent_emails(minutes_back=1)
+        if self.sync_mode != 'delta':
+            # Only process if newer than last check
+            if received_time <= self.last_check:
+                return False
+        elif received_time < datetime.now(timezone.utc) - timedelta(days=self.ledger.retention_days):
+            # Pruned from the ledger already - a change to an old message must not bring it back
+            return False
         
-        # Filter for new, actionable emails
-        new_emails = []
-        for email in emails:
-            # Parse the ISO format date properly
-            received_str = email['receivedDateTime']
-            if received_str.endswith('Z'):
-                received_time = datetime.fromisoformat(received_str[:-1] + '+00:00')
-            else:
-                received_time = datetime.fromisoformat(received_str)
+        # Delta also returns updates (e.g. read/unread), and pushed messages show up in
+        # polls too, so only act on each message once
+        return self.claim_message(email['id'])
+    
+    def describe_email(self, email):
+        """Print a new email's details and decide whether it should be analyzed"""
+        print(f"\n--- New Email ---")
+        
+        # Handle emails without 'from' field (e.g., some forwarded emails)
+        if 'from' not in email:
+            print(f"Processing email without sender info")
+            print(f"Subject: {email.get('subject', 'No subject')}")
             
-            # Only process if newer than last check
-            if received_time > self.last_check:
-                if self.is_actionable_email(email):
-                    new_emails.append(email)
-        
-        # Process new emails for todos
-        if new_emails:
-            print(f"\nFound {len(new_emails)} new email(s):")
-            for email in new_emails:
-                print(f"\n--- New Email ---")
-                
-                # Handle emails without 'from' field (e.g., some forwarded emails)
-                if 'from' not in email:
-                    print(f"Processing email without sender info")
-                    print(f"Subject: {email.get('subject', 'No subject')}")
-                    
-                    # For forwarded emails, we can still process them
-                    subject = email.get('subject', '')
-                    if subject.upper().startswith('FW:'):
-                        print("This is a forwarded email - processing anyway")
-                        
-                        # Print email details with fallback values
-                        print(f"From: (Forwarded email - sender unknown)")
-                        print(f"Subject: {subject}")
-                        print(f"Preview: {email.get('bodyPreview', '')[:100]}...")
-                        print(f"Received: {email.get('receivedDateTime', 'Unknown time')}")
-                        
-                        # Print full email body for debugging
-                        body = email.get('body', {}).get('content', '')
-                        if not body:
-                            body = email.get('bodyPreview', '')
-                        
-                        # Clean HTML for better readability
-                        import re
-                        clean_body = re.sub(r'<style[^>]*>.*?</style>', '', body, flags=re.DOTALL)
-                        clean_body = re.sub(r'<script[^>]*>.*?</script>', '', clean_body, flags=re.DOTALL)
-                        clean_body = re.sub(r'<[^>]+>', ' ', clean_body)
-                        clean_body = re.sub(r'\s+', ' ', clean_body).strip()
-                        
-                        print(f"\n=== FULL EMAIL CONTENT (CLEANED) ===")
-                        print(clean_body[:2000])
-                        if len(clean_body) > 2000:
-                            print(f"... (truncated, {len(clean_body) - 2000} more characters)")
-                        print("=== END EMAIL CONTENT ===\n")
-                        
-                        # Still analyze forwarded emails
-                        print("Analyzing forwarded email with Claude...")
-                        structured_todos = self.analyze_email_with_claude_no_sender(email)
-                        
-                        if structured_todos:
-                            # Save structured todos with JSON format
-                            self.save_structured_todos(structured_todos)
-                            
-                            # Save to Microsoft To Do
-                            try:
-                                print("\n🔄 Uploading to Microsoft To Do...")
-                                success = self.ms_todo_manager.add_structured_todos(structured_todos, "Email Tasks")
-                                if success:
-                                    print("✅ Successfully uploaded to Microsoft To Do")
-                                else:
-                                    print("⚠️ Failed to upload some/all tasks to Microsoft To Do")
-                            except Exception as e:
-                                print(f"❌ Error uploading to Microsoft To Do: {e}")
-                                import traceback
-                                traceback.print_exc()
-                            
-                            # Also save to text file for backward compatibility
-                            simple_todos = [todo['action'] for todo in structured_todos]
-                            subject = email['subject']
-                            source_info = f"Extracted from forwarded email: {subject}"
-                            self.todo_manager.save_todos_to_file(simple_todos, source_info)
-                        else:
-                            print("\n❌ No action items found for you")
-                        
-                        print("-" * 50)
+            # For forwarded emails, we can still process them
+            subject = email.get('subject', '')
+            if not subject.upper().startswith('FW:'):
+                print(f"Skipping email without 'from' field: {subject}")
+                return False
+            
+            print("This is a forwarded email - processing anyway")
+            
+            # Print email details with fallback values
+            print(f"From: (Forwarded email - sender unknown)")
+            print(f"Subject: {subject}")
+            print(f"Preview: {email.get('bodyPreview', '')[:100]}...")
+            print(f"Received: {email.get('receivedDateTime', 'Unknown time')}")
+        else:
+            print(f"From: {email['from']['emailAddress']['name']} <{email['from']['emailAddress']['address']}>")
+            print(f"Subject: {email['subject']}")
+            print(f"Preview: {email['bodyPreview'][:100]}...")
+            print(f"Received: {email['receivedDateTime']}")
+        
+        # Print full email body for debugging - the same cleaned text Claude sees
+        clean_body = email_text(email)
+        
+        print(f"\n=== FULL EMAIL CONTENT (CLEANED) ===")
+        print(clean_body[:2000])  # Limit to 2000 chars to avoid flooding terminal
+        if len(clean_body) > 2000:
+            print(f"... (truncated, {len(clean_body) - 2000} more characters)")
+        print("=== END EMAIL CONTENT ===\n")
+        
+        return True
+    
+    def analyze_email(self, email):
+        """Extract structured todos from an email - safe to run on a worker thread
+        
+        Returns None when the analysis failed, as opposed to [] for no action items.
+        """
+        if 'from' not in email:
+            # Still analyze forwarded emails
+            print(f"Analyzing forwarded email with Claude: {email.get('subject', 'No subject')}")
+            return self.analyze_email_with_claude_no_sender(email)
+        
+        # Analyze with Claude for todos
+        print(f"Analyzing with Claude: {email['subject']}")
+        return self.analyze_email_with_claude(email)
+    
+    def commit_email_todos(self, email, structured_todos):
+        """Save the todos extracted from one email to every sink"""
+        if structured_todos:
+            print(f"\n--- Results for: {email.get('subject', 'No subject')} ---")
+            
+            # Save structured todos with JSON format
+            self.save_structured_todos(structured_todos, email.get('id'))
+            
+            # Save to Microsoft To Do - todos streamed during analysis are already there
+            pending_todos = [todo for todo in structured_todos if not todo.get('uploaded_to_todo')]
+            try:
+                if pending_todos:
+                    print("\n🔄 Uploading to Microsoft To Do...")
+                    success = self.ms_todo_manager.add_structured_todos(pending_todos, "Email Tasks")
+                    if success:
+                        print("✅ Successfully uploaded to Microsoft To Do")
                     else:
-                        print(f"Skipping email without 'from' field: {subject}")
+                        print("⚠️ Failed to upload some/all tasks to Microsoft To Do")
+            except Exception as e:
+                print(f"❌ Error uploading to Microsoft To Do: {e}")
+                import traceback
+                traceback.print_exc()
+            
+            # Also save to text file for backward compatibility
+            simple_todos = [todo['action'] for todo in structured_todos]
+            subject = email['subject']
+            if 'from' in email:
+                sender = email['from']['emailAddress']['name']
+                source_info = f"Extracted from email: {sender} - {subject}"
+            else:
+                source_info = f"Extracted from forwarded email: {subject}"
+            self.todo_manager.save_todos_to_file(simple_todos, source_info)
+        elif structured_todos is None:
+            print(f"\n❌ Analysis failed for: {email.get('subject', 'No subject')}, will retry later")
+        else:
+            print(f"\n❌ No action items found for you in: {email.get('subject', 'No subject')}")
+            
+        print("-" * 50)
+    
+    def process_email(self, email):
+        """Analyze a single new email and save any extracted todos"""
+        if self.describe_email(email):
+            self.commit_email_todos(email, self.analyze_email(email))
+    
+    def process_emails(self, emails, pushed=False, recovered=False):
+        """Analyze new, actionable emails from an iterable and commit their todos
+        
+        Up to analysis_workers emails are analyzed at once, but results are committed
+        in the order the emails were fetched. Pushed emails skip the poll time window
+        and are only checked against already-processed IDs. Recovered emails are
+        still claimed from an earlier attempt and are processed as they are. Returns
+        the number of emails analyzed.
+        """
+        new_count = 0
+        in_flight = deque()
+        with ThreadPoolExecutor(max_workers=self.analysis_workers) as pool:
+            for email in emails:
+                if recovered:
+                    is_new = True
+                elif pushed:
+                    is_new = self.claim_message(email['id'])
+                else:
+                    is_new = self.is_new_email(email)
+                if not is_new:
+                    continue
+                try:
+                    actionable = (self.is_actionable_email(email)
+                                  and self.pre_classifier.should_analyze(email)
+                                  and self.describe_email(email))
+                except Exception as e:
+                    # Left claimed - retried once the claim times out, without failing the poll
+                    print(f"ERROR checking email {email['id']}, will retry later: {e}")
+                    continue
+                if not actionable:
+                    # Filtered out - nothing to analyze, but still never look at it again
+                    self.ledger.complete('email', email['id'])
                     continue
                 
-                print(f"From: {email['from']['emailAddress']['name']} <{email['from']['emailAddress']['address']}>")
-                print(f"Subject: {email['subject']}")
-                print(f"Preview: {email['bodyPreview'][:100]}...")
-                print(f"Received: {email['receivedDateTime']}")
-                
-                # Print full email body for debugging
-                body = email.get('body', {}).get('content', '')
-                if not body:
-                    body = email.get('bodyPreview', '')
-                
-                # Clean HTML for better readability
-                import re
-                # Remove HTML tags but keep text
-                clean_body = re.sub(r'<style[^>]*>.*?</style>', '', body, flags=re.DOTALL)
-                clean_body = re.sub(r'<script[^>]*>.*?</script>', '', clean_body, flags=re.DOTALL)
-                clean_body = re.sub(r'<[^>]+>', ' ', clean_body)
-                clean_body = re.sub(r'\s+', ' ', clean_body).strip()
-                
-                print(f"\n=== FULL EMAIL CONTENT (CLEANED) ===")
-                print(clean_body[:2000])  # Limit to 2000 chars to avoid flooding terminal
-                if len(clean_body) > 2000:
-                    print(f"... (truncated, {len(clean_body) - 2000} more characters)")
-                print("=== END EMAIL CONTENT ===\n")
-                
-                # Analyze with Claude for todos
-                print("Analyzing with Claude...")
-                structured_todos = self.analyze_email_with_claude(email)
+                new_count += 1
+                in_flight.append((email, pool.submit(self.analyze_email, email)))
                 
-                if structured_todos:
-                    # Save structured todos with JSON format
-                    self.save_structured_todos(structured_todos)
-                    
-                    # Save to Microsoft To Do
-                    try:
-                        print("\n🔄 Uploading to Microsoft To Do...")
-                        success = self.ms_todo_manager.add_structured_todos(structured_todos, "Email Tasks")
-                        if success:
-                            print("✅ Successfully uploaded to Microsoft To Do")
-                        else:
-                            print("⚠️ Failed to upload some/all tasks to Microsoft To Do")
-                    except Exception as e:
-                        print(f"❌ Error uploading to Microsoft To Do: {e}")
-                        import traceback
-                        traceback.print_exc()
-                    
-                    # Also save to text file for backward compatibility
-                    simple_todos = [todo['action'] for todo in structured_todos]
-                    sender = email['from']['emailAddress']['name']
-                    subject = email['subject']
-                    source_info = f"Extracted from email: {sender} - {subject}"
-                    self.todo_manager.save_todos_to_file(simple_todos, source_info)
-                else:
-                    print("\n❌ No action items found for you")
-                    
-                print("-" * 50)
+                # Commit finished emails from the front; block once enough work is queued
+                while in_flight and (in_flight[0][1].done() or len(in_flight) >= self.analysis_workers * 2):
+                    self.finish_email(*in_flight.popleft())
+            
+            while in_flight:
+                self.finish_email(*in_flight.popleft())
+        
+        return new_count
+    
+    def finish_email(self, email, future):
+        """Commit an analyzed email's todos and mark it done in the ledger
+        
+        An email whose analysis or commit fails stays claimed and is retried once the
+        claim times out.
+        """
+        try:
+            structured_todos = future.result()
+            with self._commit_lock:
+                self.commit_email_todos(email, structured_todos)
+                if structured_todos is None:
+                    # Claude never answered - an outage is neither a label nor a result
+                    return
+                self.pre_classifier.record(email, bool(structured_todos))
+                self.conversation_context.record(email, email_reply_parts(email)[0], structured_todos)
+                self.ledger.complete('email', email['id'])
+        except Exception as e:
+            print(f"ERROR saving todos for email {email['id']}, will retry later: {e}")
+    
+    def fetch_message(self, message_id):
+        """Fetch a single message by id"""
+        token = self.get_access_token()
+        if not token:
+            return None
+        
+        headers = {
+            'Authorization': f'Bearer {token}',
+            'Content-Type': 'application/json'
+        }
+        
+        endpoint = f"{self.graph_url}/users/{self.user_email}/messages/{message_id}"
+        
+        try:
+            response = self.http.get(endpoint, headers=headers, params={'$select': self.message_select})
+            if response.status_code == 404:
+                # Deleted or moved away - nothing left to retry
+                print(f"Message {message_id} no longer exists, dropping it")
+                self.ledger.release('email', message_id)
+                return None
+            response.raise_for_status()
+            return response.json()
+        except requests.exceptions.RequestException as e:
+            print(f"Error fetching message {message_id}: {e}")
+            return None
+    
+    def process_message_ids(self, message_ids, recovered=False):
+        """Process messages announced by change notifications (push mode)
+        
+        With recovered, the IDs are claims handed back by the ledger - a message that
+        cannot be fetched now stays claimed and is handed back again later.
+        """
+        emails = (self.fetch_message(message_id) for message_id in message_ids
+                  if recovered or not self.ledger.is_processed('email', message_id))
+        
+        # Claiming happens inside process_emails, so a message also seen by a poll runs once
+        new_count = self.process_emails((email for email in emails if email), pushed=True, recovered=recovered)
+        if new_count:
+            print(f"\nProcessed {new_count} pushed email(s)")
+        self.save_checkpoints()
+    
+    def check_new_emails(self):
+        """Check for new emails and extract todos"""
+        print("Checking for new emails...")
+        poll_started = datetime.now(timezone.utc)
+        
+        # Claims left behind by a failed email are handed back once they time out
+        stale_message_ids = self.ledger.recover_pending('email', stale_only=True)
+        self.recovered_message_ids.extend(stale_message_ids)
+        
+        if self.recovered_message_ids:
+            print(f"Resuming {len(self.recovered_message_ids)} email(s) interrupted by a shutdown or error")
+            recovered, self.recovered_message_ids = self.recovered_message_ids, []
+            self.process_message_ids(recovered, recovered=True)
+        
+        # Emails are streamed page by page, so the first one is processed before the last page arrives
+        if self.sync_mode == 'delta':
+            emails = self.iter_email_changes()
+        else:
+            # Cover everything since the last poll started (or stopped at its limit), however long processing took
+            emails = self.iter_recent_emails(since=self.last_check)
+        
+        new_count = self.process_emails(emails)
+        
+        if new_count:
+            print(f"\nProcessed {new_count} new email(s)")
+            print(f"Pre-classifier: {self.pre_classifier.stats()}")
         else:
             print(f"No new emails (checked at {datetime.now().strftime('%H:%M:%S')})")
         
-        # Update last check time
-        self.last_check = datetime.now(timezone.utc)
\ No newline at end of file
+        # Update last check time - mail that arrived while this poll ran is picked up next time,
+        # and so is mail left over when the poll stopped at its limit
+        with self._checkpoint_lock:
+            if self.window_fetch_failed:
+                # Keep the old check time so the next poll covers this window again
+                self.window_fetch_failed, self.window_resume_from = False, None
+            elif self.window_resume_from is not None:
+                self.last_check, self.window_resume_from = self.window_resume_from, None
+            else:
+                self.last_check = poll_started
+        self.save_checkpoints()
@@ -0,0 +1,140 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from state_store import state_path
+
+# Reply/forward prefixes stripped from subjects so a forward and its original share a key
+SUBJECT_PREFIX_PATTERN = re.compile(r'^(?:\s*(?:re|fw|fwd|aw|wg)\s*:\s*)+', re.IGNORECASE)
+
+FORWARD_SUBJECT_PATTERN = re.compile(r'^\s*(?:fw|fwd|wg)\s*:', re.IGNORECASE)
+
+# Header block Outlook and Gmail put above forwarded content: a From: line followed by
+# Sent/Date/To/Cc/Subject lines
+FORWARD_HEADER_PATTERN = re.compile(
+    r'^From:(?P<sender>[^\n]*)\n(?:(?:Sent|Date|To|Cc|Subject):[^\n]*(?:\n|$))+',
+    re.IGNORECASE | re.MULTILINE
+)
+
+EMAIL_ADDRESS_PATTERN = re.compile(r'[\w.+-]+@[\w-]+(?:\.[\w-]+)+')
+
+
+def split_forward(text):
+    """(original sender address, forwarded text) of a forward's body, or None
+
+    Everything up to the end of the first forward header block - the forwarder's
+    note, separators and the header itself - is dropped.
+    """
+    match = FORWARD_HEADER_PATTERN.search(text)
+    if not match:
+        return None
+    address = EMAIL_ADDRESS_PATTERN.search(match.group('sender'))
+    return (address.group(0) if address else ''), text[match.end():]
+
+
+def content_key(kind, sender, subject, text):
+    """Hash of the normalized content an extraction depends on
+
+    Forwards are keyed as the message they forward - original sender and text,
+    without the forwarder's address, note or header block - so forwarding an
+    email that was already analyzed reuses its result.
+    """
+    if FORWARD_SUBJECT_PATTERN.match(subject or ''):
+        forwarded = split_forward(text or '')
+        if forwarded:
+            kind = 'email'
+            sender, text = forwarded
+    normalized = '\n'.join([
+        kind,
+        (sender or '').strip().lower(),
+        ' '.join(SUBJECT_PREFIX_PATTERN.sub('', subject or '').lower().split()),
+        ' '.join((text or '').lower().split())
+    ])
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+class ExtractionCache:
+    """Disk-backed memo of Claude extraction results, keyed by content hash
+
+    Forwards, CC'd copies and resends of the same content reuse the stored action
+    items instead of calling Claude again. Entries expire after ttl_days and the
+    least recently used ones are evicted once the cache grows past max_bytes.
+    """
+
+    def __init__(self, db_path=None, ttl_days=None, max_bytes=None):
+        if ttl_days is None:
+            ttl_days = float(os.getenv('EXTRACTION_CACHE_TTL_DAYS', '30'))
+        if max_bytes is None:
+            max_bytes = int(float(os.getenv('EXTRACTION_CACHE_MAX_MB', '50')) * 1024 * 1024)
+        self.db_path = db_path or state_path('extraction_cache.sqlite3')
+        self.ttl = ttl_days * 86400
+        self.max_bytes = max_bytes
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+
+        # Monitoring counters
+        self.hits = 0
+        self.misses = 0
+        self.tokens_saved = 0
+
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS extractions ("
+                "key TEXT PRIMARY KEY, value TEXT, size INTEGER, tokens INTEGER, created_at REAL, last_used REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS extractions_last_used ON extractions (last_used)")
+            self._conn.commit()
+
+    def get(self, key):
+        """Cached action items for a key, or None on a miss or expired entry"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, tokens, created_at FROM extractions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[2] > self.ttl:
+                if row is not None:
+                    self._conn.execute("DELETE FROM extractions WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+
+            self._conn.execute("UPDATE extractions SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            self.tokens_saved += row[1]
+            return json.loads(row[0])
+
+    def put(self, key, action_items, tokens=0):
+        """Store the action items extracted for a key, evicting old entries if needed"""
+        value = json.dumps(action_items, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO extractions VALUES (?, ?, ?, ?, ?, ?)",
+                (key, value, len(value), tokens, now, now)
+            )
+            self._conn.execute("DELETE FROM extractions WHERE created_at < ?", (now - self.ttl,))
+
+            # Least recently used entries go first once over the size cap
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM extractions").fetchone()[0]
+            if total > self.max_bytes:
+                rows = self._conn.execute("SELECT key, size FROM extractions ORDER BY last_used").fetchall()
+                for old_key, size in rows:
+                    if total <= self.max_bytes:
+                        break
+                    self._conn.execute("DELETE FROM extractions WHERE key = ?", (old_key,))
+                    total -= size
+            self._conn.commit()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            'tokens_saved': self.tokens_saved
+        }
@@ -0,0 +1,169 @@
+import os
+import re
+
+# Built-in rules, used when no rules file is found - same behaviour as the old hardcoded filter
+DEFAULT_RULES = [
+    ('subject_prefix', 'accepted:'),
+    ('subject_prefix', 'declined:'),
+    ('subject_prefix', 'tentative:'),
+    ('subject_prefix', 'canceled:'),
+    ('subject_prefix', 'updated:'),
+    ('any', 'unsubscribe'),
+    ('any', 'newsletter'),
+    ('any', 'no-reply'),
+    ('any', 'noreply'),
+    ('any', 'notification'),
+    ('any', 'alert@'),
+    ('any', 'updates@'),
+    ('any', 'marketing'),
+    ('any', 'promo'),
+    ('any', 'out of office'),
+    ('any', 'automatic reply'),
+]
+
+FIELDS = ('subject', 'subject_prefix', 'sender', 'domain', 'header', 'any')
+
+
+def load_rules(path):
+    """Read (field, pattern) rules from a file
+
+    One rule per line as "field: pattern". Fields are subject, subject_prefix,
+    sender, domain, header and any (subject or sender). Patterns are
+    case-insensitive literals, or regular expressions when prefixed with "re:".
+    Blank lines and lines starting with # are ignored.
+    """
+    rules = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            field, _, pattern = line.partition(':')
+            field = field.strip().lower()
+            pattern = pattern.strip()
+            if field not in FIELDS or not pattern:
+                print(f"Warning: Ignoring invalid filter rule on line {line_number} of {path}: {line}")
+                continue
+            rules.append((field, pattern))
+    return rules
+
+
+def trie_pattern(words):
+    """Regex matching any of the given literal words, factored into a prefix trie
+
+    A trie-shaped pattern lets the regex engine reject a position after a single
+    character test instead of trying every word, so cost stays flat as lists grow.
+    Where one word is a prefix of another, the longer one is preferred.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node):
+        ends_here = '' in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        if len(branches) == 1 and not ends_here:
+            return branches[0]
+        pattern = '(?:' + '|'.join(branches) + ')'
+        return pattern + '?' if ends_here else pattern
+
+    return build(trie)
+
+
+class FilterRuleEngine:
+    """Sender/domain/subject/header skip rules compiled into a few pre-built matchers
+
+    Literal rules for each field are merged into one trie-shaped regex, and the
+    matched text maps straight back to its rule. Regex rules ("re:") for each field
+    are merged into one alternation of named groups, so the matching group tells
+    which rule fired. Checking an email costs a handful of regex searches however
+    many rules there are.
+    """
+
+    def __init__(self, rules=None, rules_file=None):
+        if rules is None:
+            if rules_file is None:
+                default_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'filter_rules.txt')
+                rules_file = os.getenv('FILTER_RULES_FILE', default_file)
+            if os.path.exists(rules_file):
+                rules = load_rules(rules_file)
+                print(f"Loaded {len(rules)} filter rule(s) from {rules_file}")
+            else:
+                rules = list(DEFAULT_RULES)
+
+        self.rules = rules
+        self.hits = [0] * len(rules)
+        # Header rules need messages fetched with their internetMessageHeaders
+        self.uses_headers = any(field == 'header' for field, _ in rules)
+
+        # Which value each rule field is matched against, and how the pattern is anchored
+        targets = {
+            'subject': ('subject', '{}'),
+            'subject_prefix': ('subject', '^(?:{})'),
+            'sender': ('sender', '{}'),
+            'domain': ('domain', '(?:^|\\.)(?:{})$'),
+            'header': ('header', '^(?:{})'),
+        }
+
+        literals = {}
+        expressions = {}
+        for index, (field, pattern) in enumerate(rules):
+            for target_field in (('subject', 'sender') if field == 'any' else (field,)):
+                key = targets[target_field]
+                if pattern.startswith('re:'):
+                    expressions.setdefault(key, []).append(f"(?P<r{index}>{pattern[3:]})")
+                else:
+                    literals.setdefault(key, {}).setdefault(pattern.lower(), index)
+
+        # (value name, compiled regex, literal -> rule index or None for regex rules)
+        self.matchers = []
+        for (value_name, anchor), words in literals.items():
+            regex = re.compile(anchor.format(trie_pattern(words)), re.MULTILINE)
+            self.matchers.append((value_name, regex, words))
+        for (value_name, anchor), parts in expressions.items():
+            regex = re.compile(anchor.format('|'.join(parts)), re.IGNORECASE | re.MULTILINE)
+            self.matchers.append((value_name, regex, None))
+
+    def match(self, email):
+        """Return the (field, pattern) of the first rule matching an email, or None"""
+        sender = (email.get('from') or {}).get('emailAddress', {}).get('address', '').lower()
+        values = {
+            'subject': (email.get('subject') or '').lower(),
+            'sender': sender,
+            'domain': sender.rsplit('@', 1)[-1] if '@' in sender else '',
+        }
+
+        # Header rules only apply when the message was fetched with internetMessageHeaders (see uses_headers)
+        headers = email.get('internetMessageHeaders')
+        if headers:
+            values['header'] = "\n".join(f"{h.get('name', '')}: {h.get('value', '')}" for h in headers).lower()
+
+        for value_name, regex, words in self.matchers:
+            value = values.get(value_name)
+            if not value:
+                continue
+            found = regex.search(value)
+            if not found:
+                continue
+            if words is not None:
+                matched = found.group(0)
+                if matched not in words:
+                    # Domain matches include the dot before the matched suffix
+                    matched = matched[1:]
+                index = words[matched]
+            else:
+                index = int(found.lastgroup[1:])
+            self.hits[index] += 1
+            return self.rules[index]
+        return None
+
+    def stats(self, top=10):
+        """Most frequently hit rules, as 'field: pattern' -> hit count"""
+        ranked = sorted(range(len(self.rules)), key=lambda index: self.hits[index], reverse=True)
+        return {f"{self.rules[index][0]}: {self.rules[index][1]}": self.hits[index]
+                for index in ranked[:top] if self.hits[index]}
@@ -1,15 +1,101 @@
 import os
+import re
 import json
+import math
+import difflib
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
 import requests
 import anthropic
 from todo_manager import TodoManager
+from http_client import get_http_client
+from ledger import get_ledger
+from rate_limit import get_rate_limiter
+from task_title_index import normalize_title
+from participant_matcher import ParticipantMatcher
 
 load_dotenv()
 
+# Assignee headings in Fireflies summary action items: "**Jane Doe**", "## Jane Doe" or "Jane Doe:"
+SUMMARY_ASSIGNEE_PATTERN = re.compile(
+    r"^(?:\*\*(.+?)\*\*|#+\s*(.+?)|([A-Z][\w.'-]*(?: [A-Z][\w.'-]*){0,3}):)$"
+)
+SUMMARY_TIMESTAMP_PATTERN = re.compile(r'\s*\(\d{1,2}:\d{2}(?::\d{2})?\)$')
+
+
+def parse_summary_action_items(action_items):
+    """Split Fireflies summary action items into (assignee, action) pairs
+    
+    Fireflies groups the items under an assignee heading, one item per line with
+    a trailing timestamp. Items before any heading get assignee None.
+    """
+    if isinstance(action_items, list):
+        text = "\n".join(str(item) for item in action_items)
+    else:
+        text = action_items or ''
+    
+    items = []
+    assignee = None
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        heading = SUMMARY_ASSIGNEE_PATTERN.match(line)
+        if heading:
+            assignee = next(group for group in heading.groups() if group).strip()
+            continue
+        action = SUMMARY_TIMESTAMP_PATTERN.sub('', line.lstrip('-*• ').strip())
+        if action:
+            items.append((assignee, action))
+    return items
+
+
+def estimate_tokens(text):
+    """Rough token count for budgeting prompts (about 4 characters per token)"""
+    return len(text) // 4 + 1
+
+
+def chunk_sentences(sentences, max_tokens, overlap=2):
+    """Split transcript sentences into consecutive 'Speaker: text' windows of about max_tokens each
+    
+    The last few lines of a window are repeated at the start of the next, so a
+    commitment spread over a chunk boundary is still seen whole.
+    """
+    chunks = []
+    current = []
+    current_tokens = 0
+    for sentence in sentences:
+        line = f"{sentence.get('speaker_name') or 'Unknown'}: {sentence.get('text') or ''}"
+        tokens = estimate_tokens(line)
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append(current)
+            current = current[-overlap:] if overlap else []
+            current_tokens = sum(estimate_tokens(previous) for previous in current)
+        current.append(line)
+        current_tokens += tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def merge_todos(todo_lists, similarity=0.85):
+    """Merge per-chunk todo lists, dropping exact and near-duplicate items"""
+    merged = []
+    seen = []
+    for todos in todo_lists:
+        for todo in todos:
+            normalized = normalize_title(todo)
+            if any(normalized == previous or difflib.SequenceMatcher(None, normalized, previous).ratio() >= similarity
+                   for previous in seen):
+                continue
+            seen.append(normalized)
+            merged.append(todo)
+    return merged
+
+
 class FirefliesMonitor:
-    def __init__(self):
+    def __init__(self, http_client=None, ledger=None):
         self.fireflies_api_key = os.getenv('FIREFLIES_API_KEY')
         self.claude_api_key = os.getenv('ANTHROPIC_API_KEY')
         self.user_email = os.getenv('USER_EMAIL')
@@ -17,42 +103,133 @@ class FirefliesMonitor:
         # GraphQL endpoint
         self.api_url = "https://api.fireflies.ai/graphql"
         
+        # Shared pooled HTTP transport
+        self.http = http_client or get_http_client()
+        
         # Initialize Claude client
         if self.claude_api_key:
             self.claude_client = anthropic.Anthropic(api_key=self.claude_api_key)
         else:
             self.claude_client = None
         
+        # Long transcripts are analyzed in token-budgeted chunks, several at a time
+        self.chunk_threshold = int(os.getenv('FIREFLIES_CHUNK_THRESHOLD', '500'))
+        self.chunk_tokens = int(os.getenv('FIREFLIES_CHUNK_TOKENS', '6000'))
+        self.chunk_workers = max(1, int(os.getenv('FIREFLIES_CHUNK_WORKERS', '4')))
+        self.rate_limiter = get_rate_limiter()
+        
+        # Transcript analysis model (TRANSCRIPT_MODEL)
+        self.model = os.getenv('TRANSCRIPT_MODEL', 'claude-3-5-sonnet-20241022')
+        
+        # Who "me" is in a transcript - USER_NAME, USER_ALIASES, email handle, FIREFLIES_SPEAKER_IDS
+        self.participant_matcher = ParticipantMatcher(user_email=self.user_email or '')
+        self.user_name = self.participant_matcher.user_name
+        self.excerpt_tokens = int(os.getenv('FIREFLIES_EXCERPT_TOKENS', '4000'))
+        
+        # Fireflies' own action items assigned to the user are used as-is when the
+        # transcript never names them (FIREFLIES_USE_SUMMARY_ITEMS)
+        self.use_summary_items = os.getenv('FIREFLIES_USE_SUMMARY_ITEMS', 'true').lower() == 'true'
+        self.calls_avoided = 0
+        self.summary_answers = 0
+        
         # Initialize todo manager
         self.todo_manager = TodoManager()
         
-        # Track last check time for transcripts
-        self.last_transcript_check = datetime.now(timezone.utc) - timedelta(hours=1)
+        # Durable ledger of processed transcript IDs and the last check time
+        self.ledger = ledger or get_ledger()
+        
+        # Track last check time for transcripts, resumed from the ledger after a restart
+        last_check = self.ledger.get_checkpoint('fireflies_last_check')
+        if last_check:
+            self.last_transcript_check = datetime.fromisoformat(last_check)
+        else:
+            self.last_transcript_check = datetime.now(timezone.utc) - timedelta(hours=1)
+        self.max_lookback_hours = int(os.getenv('FIREFLIES_MAX_LOOKBACK_HOURS', '72'))
+        
+        # Transcripts listed per request - Fireflies allows at most 50
+        self.page_size = max(1, min(int(os.getenv('FIREFLIES_PAGE_SIZE', '50')), 50))
+        
+        # Transcripts claimed before a crash but never saved - processed again on the first poll
+        self.recovered_transcript_ids = self.ledger.recover_pending('transcript')
     
-    def get_recent_transcripts(self, hours_back=1):
-        """Fetch transcripts from the last X hours"""
+    def run_query(self, query, variables):
+        """Run a Fireflies GraphQL query and return its data, or None on failure"""
         if not self.fireflies_api_key:
             print("ERROR: Fireflies API key not configured")
-            return []
+            return None
         
         headers = {
             'Authorization': f'Bearer {self.fireflies_api_key}',
             'Content-Type': 'application/json'
         }
         
-        # Calculate time filter - Fireflies uses ISO format
+        payload = {
+            "query": query,
+            "variables": variables
+        }
+        
+        try:
+            response = self.http.post(self.api_url, headers=headers, json=payload)
+            response.raise_for_status()
+            
+            data = response.json()
+            
+            if 'errors' in data:
+                print(f"ERROR GraphQL: {data['errors']}")
+                return None
+            
+            return data.get('data') or {}
+            
+        except requests.exceptions.RequestException as e:
+            print(f"ERROR fetching transcripts: {e}")
+            return None
+    
+    def iter_transcript_pages(self, hours_back=1):
+        """Yield id, title and date of the transcripts from the last X hours, one page at a time
+        
+        Pages of page_size are requested with skip until a short page comes back.
+        A failed request yields None and ends the listing.
+        """
+        # Calculate time filter - Fireflies uses ISO format, fixed for the whole listing
         from_date = (datetime.now(timezone.utc) - timedelta(hours=hours_back)).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
         
-        # GraphQL query to get recent transcripts
+        # Metadata only - sentences are fetched per transcript, and only for new ones
         query = """
-        query GetRecentTranscripts($fromDate: DateTime!) {
+        query ListRecentTranscripts($fromDate: DateTime!, $limit: Int!, $skip: Int!) {
           transcripts(
             fromDate: $fromDate
-            limit: 20
+            limit: $limit
+            skip: $skip
           ) {
             id
             title
             date
+          }
+        }
+        """
+        
+        skip = 0
+        while True:
+            data = self.run_query(query, {"fromDate": from_date, "limit": self.page_size, "skip": skip})
+            if data is None:
+                yield None
+                return
+            
+            page = data.get('transcripts') or []
+            if page:
+                yield page
+            if len(page) < self.page_size:
+                return
+            skip += len(page)
+    
+    def get_transcript(self, transcript_id):
+        """Fetch one transcript with its summary and sentences"""
+        query = """
+        query GetTranscript($transcriptId: String!) {
+          transcript(id: $transcriptId) {
+            id
+            title
+            date
             organizer_email
             participants
             summary {
@@ -68,37 +245,29 @@ class FirefliesMonitor:
         }
         """
         
-        variables = {
-            "fromDate": from_date
-        }
-        
-        payload = {
-            "query": query,
-            "variables": variables
-        }
-        
-        try:
-            response = requests.post(self.api_url, headers=headers, json=payload)
-            response.raise_for_status()
-            
-            data = response.json()
-            
-            if 'errors' in data:
-                print(f"ERROR GraphQL: {data['errors']}")
-                return []
-            
-            transcripts = data.get('data', {}).get('transcripts', [])
-            return transcripts
-            
-        except requests.exceptions.RequestException as e:
-            print(f"ERROR fetching transcripts: {e}")
-            return []
+        data = self.run_query(query, {"transcriptId": transcript_id})
+        if data is None:
+            return None
+        return data.get('transcript')
+    
+    def get_recent_transcripts(self, hours_back=1):
+        """Fetch full transcripts from the last X hours"""
+        transcripts = []
+        for page in self.iter_transcript_pages(hours_back=hours_back):
+            for listed in page or []:
+                transcript = self.get_transcript(listed['id'])
+                if transcript:
+                    transcripts.append(transcript)
+        return transcripts
     
     def analyze_transcript_with_claude(self, transcript):
-        """Analyze transcript for Dylan-specific action items"""
+        """Analyze transcript for action items assigned to the user
+        
+        Returns None if Claude could not be asked, so the transcript is retried.
+        """
         if not self.claude_client:
             print("ERROR: Claude API key not configured")
-            return []
+            return None
         
         # API key validation removed - will fail gracefully if invalid
         
@@ -113,22 +282,47 @@ class FirefliesMonitor:
             if transcript.get('summary') and transcript['summary'].get('action_items'):
                 summary_action_items = transcript['summary']['action_items']
             
-            # Get sentences where Dylan is mentioned or speaking
-            dylan_sentences = []
-            for sentence in transcript.get('sentences', []):
-                text = (sentence.get('text') or '').lower()
-                speaker = (sentence.get('speaker_name') or '').lower()
-                
-                # Include if Dylan is speaking or mentioned
-                if 'dylan' in text or 'dylan' in speaker:
-                    dylan_sentences.append({
-                        'speaker': sentence.get('speaker_name', 'Unknown'),
-                        'text': sentence.get('text', '')
-                    })
+            # Sentences spoken by or mentioning the user
+            sentences = transcript.get('sentences') or []
+            mention_indexes = self.participant_matcher.mention_indexes(sentences)
+            speaker_indexes = self.participant_matcher.speaker_indexes(sentences)
+            
+            # Local short-circuit - Fireflies' own action items often settle it without Claude
+            summary_items = parse_summary_action_items(summary_action_items)
+            user_items = [action for assignee, action in summary_items
+                          if assignee and self.participant_matcher.mentions(assignee)]
+            summary_mentions = any(self.participant_matcher.mentions(action) for _, action in summary_items)
+            
+            if not (user_items or summary_mentions or mention_indexes or speaker_indexes):
+                self.calls_avoided += 1
+                print(f"{self.user_name} does not speak and is not mentioned - skipping Claude")
+                return []
+            
+            if user_items and self.use_summary_items and not (mention_indexes or summary_mentions):
+                self.calls_avoided += 1
+                self.summary_answers += 1
+                print(f"Using {len(user_items)} action item(s) Fireflies assigned to {self.user_name} - skipping Claude")
+                return user_items
+            
+            # Matching sentences with their neighbours for context
+            excerpts = self.participant_matcher.excerpts(sentences, sorted(set(mention_indexes) | set(speaker_indexes)))
+            
+            # Long transcripts are covered in full by the chunked map-reduce path
+            if len(sentences) > self.chunk_threshold:
+                return self.analyze_transcript_chunked(transcript, summary_action_items)
+            
+            # Whole excerpts, up to the token budget
+            selected = []
+            budget = self.excerpt_tokens
+            for excerpt in excerpts:
+                budget -= estimate_tokens(json.dumps(excerpt))
+                if budget < 0 and selected:
+                    break
+                selected.append(excerpt)
             
             # Prepare the prompt
             prompt = f"""
-            Analyze this meeting transcript and extract any action items or todos that are specifically assigned to Dylan (me).
+            Analyze this meeting transcript and extract any action items or todos that are specifically assigned to {self.user_name} (me).
             
             Meeting Details:
             Title: {title}
@@ -138,149 +332,224 @@ class FirefliesMonitor:
             Existing Action Items from Summary:
             {json.dumps(summary_action_items, indent=2)}
             
-            Dylan-related excerpts from transcript:
-            {json.dumps(dylan_sentences[:20], indent=2) if dylan_sentences else 'No Dylan mentions found'}  # Limit to first 20 for token efficiency
+            {self.user_name}-related excerpts from transcript (each with the surrounding sentences, {len(selected)} of {len(excerpts)}):
+            {json.dumps(selected, indent=2) if selected else f'No {self.user_name} mentions found'}
             
             Instructions:
-            - Only extract action items that Dylan specifically needs to do
-            - Look for phrases like "Dylan will...", "Dylan can you...", "@Dylan", etc.
-            - it may not explicitly mention Dylan, but if the context implies a task for Dylan, include it
-            - Include follow-ups, commitments, or tasks Dylan agreed to
-            - Ignore general discussion or questions Dylan asked without commitments
+            - Only extract action items that {self.user_name} specifically needs to do
+            - Look for phrases like "{self.user_name} will...", "{self.user_name} can you...", "@{self.user_name}", etc.
+            - it may not explicitly mention {self.user_name}, but if the context implies a task for {self.user_name}, include it
+            - Include follow-ups, commitments, or tasks {self.user_name} agreed to
+            - Ignore general discussion or questions {self.user_name} asked without commitments
             - Format each todo as a clear, actionable statement
             - Include relevant context or deadlines if mentioned
-            - If there are no specific action items for Dylan, respond with "NO_TODOS"
+            - If there are no specific action items for {self.user_name}, respond with "NO_TODOS"
             
             Format your response as a simple list, one todo per line, starting each with "- "
             """
             
-            # Get all sentences but limit them for the prompt
-            all_sentences = transcript.get('sentences', [])
+            return self.parse_todo_lines(self.ask_claude(prompt))
             
-            # If transcript is very long, just use summary and Dylan mentions
-            if len(all_sentences) > 500:
-                # For very long transcripts, focus on Dylan mentions only
-                prompt = f"""
-                Analyze this meeting transcript and extract any action items or todos that are specifically assigned to Dylan (me).
-                
-                Meeting Details:
-                Title: {title}
-                Date: {date}
-                Organizer: {organizer}
-                
-                Existing Action Items from Summary:
-                {json.dumps(summary_action_items, indent=2)}
-                
-                Dylan-related excerpts (found {len(dylan_sentences)} mentions):
-                {json.dumps(dylan_sentences[:30], indent=2) if dylan_sentences else 'No Dylan mentions found'}
-                
-                Instructions:
-                - Only extract action items that Dylan specifically needs to do
-                - If there are no specific action items for Dylan, respond with "NO_TODOS"
-                
-                Format your response as a simple list, one todo per line, starting each with "- "
-                """
-            
-            response = self.claude_client.messages.create(
-                model="claude-3-5-sonnet-20241022",  # Use latest non-deprecated model
-                max_tokens=2000,
-                messages=[{"role": "user", "content": prompt}]
-            )
+        except Exception as e:
+            print(f"ERROR analyzing transcript with Claude: {e}")
+            return None
+    
+    def ask_claude(self, prompt):
+        """Send a transcript prompt to Claude and return the response text"""
+        for attempt in range(3):
+            self.rate_limiter.wait()
+            try:
+                raw_response = self.claude_client.messages.with_raw_response.create(
+                    model=self.model,
+                    max_tokens=2000,
+                    messages=[{"role": "user", "content": prompt}]
+                )
+                break
+            except anthropic.RateLimitError as e:
+                self.rate_limiter.throttle(e.response.headers)
+                if attempt == 2:
+                    raise
+        
+        self.rate_limiter.update(raw_response.headers)
+        return raw_response.parse().content[0].text.strip()
+    
+    def parse_todo_lines(self, result):
+        """Parse the "- " todo list out of a Claude response"""
+        if result == "NO_TODOS":
+            return []
+        
+        todos = []
+        for line in result.split('\n'):
+            line = line.strip()
+            if line.startswith('- '):
+                todo_text = line[2:].strip()
+                # Filter out "no todos found" type messages
+                if not any(phrase in todo_text.lower() for phrase in [
+                    'no action items', 'no todos', 'cannot identify', 
+                    'no specific action', f'no {self.user_name.lower()} mentions'
+                ]):
+                    todos.append(todo_text)
+        
+        return todos
+    
+    def analyze_transcript_chunk(self, transcript, summary_action_items, lines, index, count):
+        """Map step: extract the user's todos from one window of the transcript"""
+        excerpt = "\n".join(lines)
+        prompt = f"""
+            Analyze this part ({index} of {count}) of a meeting transcript and extract any action items or todos that are specifically assigned to {self.user_name} (me).
             
-            result = response.content[0].text.strip()
+            Meeting Details:
+            Title: {transcript.get('title', 'Unknown Meeting')}
+            Date: {transcript.get('date', '')}
+            Organizer: {transcript.get('organizer_email', 'Unknown')}
             
-            if result == "NO_TODOS":
-                return []
+            Existing Action Items from Summary:
+            {json.dumps(summary_action_items, indent=2)}
             
-            # Parse todos from response
-            todos = []
-            for line in result.split('\n'):
-                line = line.strip()
-                if line.startswith('- '):
-                    todo_text = line[2:].strip()
-                    # Filter out "no todos found" type messages
-                    if not any(phrase in todo_text.lower() for phrase in [
-                        'no action items', 'no todos', 'cannot identify', 
-                        'no specific action', 'no dylan mentions'
-                    ]):
-                        todos.append(todo_text)
+            Transcript excerpt:
+            {excerpt}
             
-            return todos
+            Instructions:
+            - Only extract action items that {self.user_name} specifically needs to do
+            - Look for phrases like "{self.user_name} will...", "{self.user_name} can you...", "@{self.user_name}", etc.
+            - it may not explicitly mention {self.user_name}, but if the context implies a task for {self.user_name}, include it
+            - Include follow-ups, commitments, or tasks {self.user_name} agreed to
+            - Only use this excerpt - other parts of the meeting are analyzed separately
+            - Format each todo as a clear, actionable statement
+            - Include relevant context or deadlines if mentioned
+            - If there are no specific action items for {self.user_name}, respond with "NO_TODOS"
             
+            Format your response as a simple list, one todo per line, starting each with "- "
+            """
+        try:
+            return self.parse_todo_lines(self.ask_claude(prompt))
         except Exception as e:
-            print(f"ERROR analyzing transcript with Claude: {e}")
-            return []
+            print(f"ERROR analyzing transcript chunk {index}/{count} with Claude: {e}")
+            return None
+    
+    def analyze_transcript_chunked(self, transcript, summary_action_items):
+        """Map-reduce analysis: extract per chunk concurrently, then merge and dedupe
+        
+        Returns None if any chunk failed - a partial result would lose that chunk's
+        todos for good once the transcript is marked done.
+        """
+        chunks = chunk_sentences(transcript.get('sentences') or [], self.chunk_tokens)
+        print(f"Analyzing {len(transcript.get('sentences') or [])} sentences in {len(chunks)} chunk(s)...")
+        
+        with ThreadPoolExecutor(max_workers=min(self.chunk_workers, len(chunks))) as pool:
+            futures = [
+                pool.submit(self.analyze_transcript_chunk, transcript, summary_action_items, lines, index, len(chunks))
+                for index, lines in enumerate(chunks, 1)
+            ]
+            results = [future.result() for future in futures]
+        if any(result is None for result in results):
+            return None
+        # Reduce in transcript order so the earliest wording of a repeated item wins
+        return merge_todos(results)
+    
+    def stats(self):
+        return {
+            'calls_avoided': self.calls_avoided,
+            'summary_answers': self.summary_answers
+        }
+    
+    def process_transcript(self, transcript_id, claimed=False):
+        """Download one new transcript, extract its todos and mark it done
+        
+        With claimed, the transcript is a claim handed back by the ledger and is
+        processed without claiming it again. Returns False if the transcript could
+        not be fetched.
+        """
+        transcript = self.get_transcript(transcript_id)
+        if not transcript:
+            print(f"ERROR fetching transcript {transcript_id}, will retry next poll")
+            return False
+        if not claimed and not self.ledger.claim('transcript', transcript_id):
+            return True
+        
+        print(f"\n--- New Transcript ---")
+        print(f"Title: {transcript.get('title', 'Unknown')}")
+        print(f"Date: {transcript.get('date', 'Unknown')}")
+        print(f"Organizer: {transcript.get('organizer_email', 'Unknown')}")
+        
+        participants = transcript.get('participants', [])
+        if participants:
+            # participants is now a list of email strings
+            print(f"Participants: {', '.join(participants[:5])}")  # Limit display
+        
+        # Analyze with Claude for todos
+        print("Analyzing transcript with Claude...")
+        todos = self.analyze_transcript_with_claude(transcript)
+        
+        if todos is None:
+            # Left claimed, so the transcript is handed back once the claim times out
+            print("Analysis failed, will retry later")
+            print("-" * 50)
+            return True
+        
+        if todos:
+            print(f"Found {len(todos)} action item(s) for {self.user_name}:")
+            for todo in todos:
+                print(f"  - {todo}")
+            
+            # Save todos using TodoManager
+            title = transcript.get('title', 'Unknown Meeting')
+            date = transcript.get('date', '')
+            source_info = f"Extracted from Fireflies transcript: {title} [{date}]"
+            self.todo_manager.save_todos_to_file(todos, source_info)
+        else:
+            print(f"No action items found for {self.user_name}")
+        
+        self.ledger.complete('transcript', transcript_id)
+        print("-" * 50)
+        return True
     
     def check_new_transcripts(self):
         """Check for new transcripts and extract todos"""
         print("Checking for new Fireflies transcripts (all meetings)...")
         
-        # Get recent transcripts
-        transcripts = self.get_recent_transcripts(hours_back=1)
-        
-        # Filter for new transcripts
-        new_transcripts = []
-        for transcript in transcripts:
-            # Parse the transcript date
-            transcript_date_raw = transcript.get('date')
-            if transcript_date_raw:
-                try:
-                    # Check if date is a timestamp in milliseconds (integer)
-                    if isinstance(transcript_date_raw, (int, float)):
-                        transcript_date = datetime.fromtimestamp(transcript_date_raw / 1000, tz=timezone.utc)
-                    # Otherwise try to parse as ISO string
-                    elif isinstance(transcript_date_raw, str):
-                        if transcript_date_raw.endswith('Z'):
-                            transcript_date = datetime.fromisoformat(transcript_date_raw[:-1] + '+00:00')
-                        else:
-                            transcript_date = datetime.fromisoformat(transcript_date_raw)
-                    else:
-                        # Unknown format, include it anyway
-                        new_transcripts.append(transcript)
-                        continue
-                    
-                    # Only process if newer than last check
-                    if transcript_date > self.last_transcript_check:
-                        new_transcripts.append(transcript)
-                except Exception as e:
-                    print(f"Warning: Error parsing date for transcript {transcript.get('id')}: {e}")
-                    # Include it anyway if we can't parse the date
-                    new_transcripts.append(transcript)
-        
-        # Process new transcripts for todos
-        if new_transcripts:
-            print(f"\nFound {len(new_transcripts)} new transcript(s):")
-            for transcript in new_transcripts:
-                print(f"\n--- New Transcript ---")
-                print(f"Title: {transcript.get('title', 'Unknown')}")
-                print(f"Date: {transcript.get('date', 'Unknown')}")
-                print(f"Organizer: {transcript.get('organizer_email', 'Unknown')}")
-                
-                participants = transcript.get('participants', [])
-                if participants:
-                    # participants is now a list of email strings
-                    print(f"Participants: {', '.join(participants[:5])}")  # Limit display
-                
-                # Analyze with Claude for todos
-                print("Analyzing transcript with Claude...")
-                todos = self.analyze_transcript_with_claude(transcript)
-                
-                if todos:
-                    print(f"Found {len(todos)} action item(s) for Dylan:")
-                    for todo in todos:
-                        print(f"  - {todo}")
-                    
-                    # Save todos using TodoManager
-                    title = transcript.get('title', 'Unknown Meeting')
-                    date = transcript.get('date', '')
-                    source_info = f"Extracted from Fireflies transcript: {title} [{date}]"
-                    self.todo_manager.save_todos_to_file(todos, source_info)
-                else:
-                    print("No action items found for Dylan")
-                    
-                print("-" * 50)
+        poll_started = datetime.now(timezone.utc)
+        
+        # A transcript whose processing failed stays claimed - it is handed back once the
+        # claim times out and redone here, outside the time window
+        self.recovered_transcript_ids.extend(self.ledger.recover_pending('transcript', stale_only=True))
+        if self.recovered_transcript_ids:
+            print(f"Resuming {len(self.recovered_transcript_ids)} transcript(s) interrupted by a shutdown or error")
+            recovered, self.recovered_transcript_ids = self.recovered_transcript_ids, []
+            for transcript_id in recovered:
+                # Left claimed on failure, so it comes back after the claim timeout
+                self.process_transcript(transcript_id, claimed=True)
+        
+        # Look back to the last successful check (plus an hour of overlap, since transcripts
+        # show up some time after the meeting) - the ledger filters out anything already done
+        hours_since_check = (poll_started - self.last_transcript_check).total_seconds() / 3600
+        hours_back = min(math.ceil(hours_since_check) + 1, self.max_lookback_hours)
+        
+        # Cheap metadata listing first, a page at a time - already processed transcripts are never downloaded
+        new_count = 0
+        fetch_failed = False
+        for page in self.iter_transcript_pages(hours_back=hours_back):
+            if page is None:
+                fetch_failed = True
+                break
+            
+            for item in page:
+                transcript_id = item.get('id')
+                if not transcript_id or self.ledger.is_processed('transcript', transcript_id):
+                    continue
+                new_count += 1
+                if not self.process_transcript(transcript_id):
+                    fetch_failed = True
+        
+        if new_count:
+            print(f"\nProcessed {new_count} new transcript(s)")
         else:
             print("No new transcripts found")
         
+        if fetch_failed:
+            # Keep the old check time so the next poll covers this window again
+            return
+        
         # Update last check time
-        self.last_transcript_check = datetime.now(timezone.utc)
\ No newline at end of file
+        self.last_transcript_check = poll_started
+        self.ledger.set_checkpoint('fireflies_last_check', poll_started.isoformat())
\ No newline at end of file
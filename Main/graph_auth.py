@@ -0,0 +1,121 @@
+import os
+import time
+import threading
+import msal
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# MSAL serves its cached token until it is within this many seconds of expiry
+MSAL_EXPIRY_WINDOW = 300
+
+
+class GraphTokenProvider:
+    """App-only Graph token cached in memory and refreshed ahead of expiry
+
+    Tokens are served from memory while valid. Once a token enters the refresh
+    margin it is still returned, and a background thread fetches the next one,
+    so callers only block on MSAL for the very first token (or after a failure).
+    """
+
+    def __init__(self, client_id=None, client_secret=None, tenant_id=None, refresh_margin=None):
+        self.client_id = client_id or os.getenv('CLIENT_ID')
+        self.client_secret = client_secret or os.getenv('CLIENT_SECRET')
+        self.tenant_id = tenant_id or os.getenv('TENANT_ID')
+
+        self.authority = f"https://login.microsoftonline.com/{self.tenant_id}"
+        self.scope = ["https://graph.microsoft.com/.default"]
+
+        # Seconds before expiry at which a background refresh starts. Any earlier and MSAL
+        # would hand back the same cached token, so every call would start another refresh
+        if refresh_margin is None:
+            refresh_margin = int(os.getenv('GRAPH_TOKEN_REFRESH_MARGIN', str(MSAL_EXPIRY_WINDOW)))
+        if refresh_margin > MSAL_EXPIRY_WINDOW:
+            print(f"Warning: GRAPH_TOKEN_REFRESH_MARGIN={refresh_margin} exceeds MSAL's "
+                  f"{MSAL_EXPIRY_WINDOW}s expiry window, using {MSAL_EXPIRY_WINDOW}")
+            refresh_margin = MSAL_EXPIRY_WINDOW
+        self.refresh_margin = refresh_margin
+
+        # Initialize MSAL app
+        self.app = msal.ConfidentialClientApplication(
+            self.client_id,
+            authority=self.authority,
+            client_credential=self.client_secret
+        )
+
+        self._token = None
+        self._expires_at = 0
+        self._lock = threading.Lock()
+        self._acquire_lock = threading.Lock()
+        self._refreshing = False
+
+        # Counters to confirm token acquisition stays off the request path
+        self.hits = 0
+        self.misses = 0
+        self.background_refreshes = 0
+
+    def get_token(self):
+        """Return a valid access token, or None if one cannot be acquired"""
+        with self._lock:
+            now = time.time()
+            if self._token and now < self._expires_at:
+                self.hits += 1
+                if now >= self._expires_at - self.refresh_margin and not self._refreshing:
+                    self._refreshing = True
+                    threading.Thread(target=self._background_refresh, daemon=True).start()
+                return self._token
+            self.misses += 1
+
+        return self._acquire()
+
+    def _acquire(self):
+        """Fetch a new token from MSAL and cache it"""
+        with self._acquire_lock:
+            # Another thread may have refreshed while we waited
+            with self._lock:
+                if self._token and time.time() < self._expires_at - self.refresh_margin:
+                    return self._token
+
+            result = self.app.acquire_token_for_client(scopes=self.scope)
+
+            if "access_token" in result:
+                with self._lock:
+                    self._token = result['access_token']
+                    self._expires_at = time.time() + int(result.get('expires_in', 3600))
+                return result['access_token']
+            else:
+                print(f"Error getting token: {result.get('error')}")
+                print(f"Description: {result.get('error_description')}")
+                return None
+
+    def _background_refresh(self):
+        try:
+            if self._acquire():
+                self.background_refreshes += 1
+        except Exception as e:
+            print(f"Error refreshing Graph token in background: {e}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def stats(self):
+        """Cache counters for monitoring"""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'background_refreshes': self.background_refreshes,
+            'expires_in': max(0, int(self._expires_at - time.time()))
+        }
+
+
+_shared_provider = None
+_shared_provider_lock = threading.Lock()
+
+
+def get_token_provider():
+    """Return the process-wide GraphTokenProvider, creating it on first use"""
+    global _shared_provider
+    with _shared_provider_lock:
+        if _shared_provider is None:
+            _shared_provider = GraphTokenProvider()
+        return _shared_provider
@@ -0,0 +1,202 @@
+import os
+import json
+import secrets
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import requests
+from state_store import state_path, load_json, save_json
+
+
+class GraphSubscriptionManager:
+    """Creates and renews the Graph change-notification subscription for the inbox"""
+
+    def __init__(self, http_client, token_provider, user_email, notification_url,
+                 client_state=None, lifetime_minutes=None, renew_margin_minutes=None):
+        self.http = http_client
+        self.token_provider = token_provider
+        self.user_email = user_email
+        self.notification_url = notification_url
+        self.graph_url = "https://graph.microsoft.com/v1.0"
+
+        # Mail subscriptions may live at most 4230 minutes
+        if lifetime_minutes is None:
+            lifetime_minutes = int(os.getenv('WEBHOOK_SUBSCRIPTION_MINUTES', '4200'))
+        if renew_margin_minutes is None:
+            renew_margin_minutes = int(os.getenv('WEBHOOK_RENEW_MARGIN_MINUTES', '720'))
+        self.lifetime = timedelta(minutes=min(lifetime_minutes, 4230))
+        self.renew_margin = timedelta(minutes=renew_margin_minutes)
+
+        self.state_file = state_path('graph_subscription.json')
+        self.state = load_json(self.state_file, {})
+
+        # clientState is echoed in every notification and proves it came from our subscription
+        self.client_state = client_state or os.getenv('WEBHOOK_CLIENT_STATE') or self.state.get('client_state')
+        if not self.client_state:
+            self.client_state = secrets.token_urlsafe(32)
+
+    def _headers(self):
+        return {
+            'Authorization': f'Bearer {self.token_provider.get_token()}',
+            'Content-Type': 'application/json'
+        }
+
+    def _save(self, subscription):
+        self.state = {
+            'id': subscription['id'],
+            'expiration': subscription['expirationDateTime'],
+            'notification_url': self.notification_url,
+            'client_state': self.client_state
+        }
+        save_json(self.state_file, self.state)
+
+    def ensure_subscription(self):
+        """Create the subscription, or renew it if it expires within the renew margin"""
+        now = datetime.now(timezone.utc)
+        expiration = (now + self.lifetime).strftime('%Y-%m-%dT%H:%M:%S.0000000Z')
+
+        subscription_id = self.state.get('id')
+        if subscription_id and self.state.get('notification_url') == self.notification_url:
+            expires_at = datetime.fromisoformat(self.state['expiration'])
+            if expires_at - now > self.renew_margin:
+                return subscription_id
+
+            try:
+                response = self.http.patch(
+                    f"{self.graph_url}/subscriptions/{subscription_id}",
+                    headers=self._headers(),
+                    json={'expirationDateTime': expiration}
+                )
+                response.raise_for_status()
+                self._save(response.json())
+                print(f"Renewed Graph subscription {subscription_id} until {expiration}")
+                return subscription_id
+            except requests.exceptions.RequestException as e:
+                # Subscription was removed on the Graph side - create a new one below
+                print(f"Error renewing Graph subscription, recreating: {e}")
+
+        subscription_data = {
+            'changeType': 'created',
+            'notificationUrl': self.notification_url,
+            'resource': f"users/{self.user_email}/mailFolders('Inbox')/messages",
+            'expirationDateTime': expiration,
+            'clientState': self.client_state
+        }
+
+        try:
+            response = self.http.post(
+                f"{self.graph_url}/subscriptions",
+                headers=self._headers(),
+                json=subscription_data
+            )
+            response.raise_for_status()
+            subscription = response.json()
+            self._save(subscription)
+            print(f"Created Graph subscription {subscription['id']} until {expiration}")
+            return subscription['id']
+        except requests.exceptions.RequestException as e:
+            print(f"Error creating Graph subscription: {e}")
+            if hasattr(e.response, 'text'):
+                print(f"Response: {e.response.text}")
+            return None
+
+
+class NotificationReceiver:
+    """Embedded HTTP endpoint that receives Graph change notifications
+
+    Answers Graph's validation handshake, drops notifications whose clientState
+    does not match, and hands the message IDs of valid ones to on_message_ids.
+    """
+
+    def __init__(self, client_state, on_message_ids, host=None, port=None):
+        self.client_state = client_state
+        self.on_message_ids = on_message_ids
+        self.host = host or os.getenv('WEBHOOK_HOST', '0.0.0.0')
+        self.port = int(port or os.getenv('WEBHOOK_PORT') or os.getenv('PORT') or 8000)
+        self.received = 0
+        self.rejected = 0
+        self.server = None
+
+    def _make_handler(self):
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                query = parse_qs(urlparse(self.path).query)
+
+                # Subscription validation - echo the token back as plain text within 10 seconds
+                if 'validationToken' in query:
+                    token = query['validationToken'][0].encode('utf-8')
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/plain')
+                    self.send_header('Content-Length', str(len(token)))
+                    self.end_headers()
+                    self.wfile.write(token)
+                    return
+
+                try:
+                    length = int(self.headers.get('Content-Length', 0))
+                    payload = json.loads(self.rfile.read(length) or b'{}')
+                except (ValueError, json.JSONDecodeError):
+                    self.send_response(400)
+                    self.end_headers()
+                    return
+
+                message_ids = []
+                for notification in payload.get('value', []):
+                    if notification.get('clientState') != receiver.client_state:
+                        receiver.rejected += 1
+                        continue
+                    message_id = (notification.get('resourceData') or {}).get('id')
+                    if message_id:
+                        message_ids.append(message_id)
+
+                # Acknowledge quickly - Graph retries and eventually drops slow endpoints
+                self.send_response(202)
+                self.end_headers()
+
+                if message_ids:
+                    receiver.received += len(message_ids)
+                    receiver.on_message_ids(message_ids)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        """Start serving on a background thread"""
+        self.server = ThreadingHTTPServer((self.host, self.port), self._make_handler())
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        print(f"Listening for Graph notifications on {self.host}:{self.port}")
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+
+
+def post_sample_notification(url, message_ids, client_state):
+    """Local stand-in for Graph: post a change notification for the given message IDs"""
+    payload = {
+        'value': [
+            {
+                'subscriptionId': 'local-test',
+                'clientState': client_state,
+                'changeType': 'created',
+                'resource': f"messages/{message_id}",
+                'resourceData': {'@odata.type': '#Microsoft.Graph.Message', 'id': message_id}
+            }
+            for message_id in message_ids
+        ]
+    }
+    response = requests.post(url, json=payload, timeout=10)
+    print(f"Posted {len(message_ids)} sample notification(s) to {url}: HTTP {response.status_code}")
+    return response.status_code
+
+
+if __name__ == '__main__':
+    # Usage: python graph_webhook.py <receiver url> <client state> <message id> [<message id> ...]
+    import sys
+    post_sample_notification(sys.argv[1], sys.argv[3:], sys.argv[2])
@@ -0,0 +1,116 @@
+import re
+from html.parser import HTMLParser
+
+# Elements whose content is never readable text
+SKIPPED_TAGS = {'style', 'script', 'head', 'title', 'xml', 'template', 'noscript'}
+
+# Elements that start a new line in the rendered text
+BLOCK_TAGS = {
+    'address', 'article', 'blockquote', 'br', 'dd', 'div', 'dl', 'dt', 'footer', 'h1', 'h2', 'h3',
+    'h4', 'h5', 'h6', 'header', 'hr', 'li', 'ol', 'p', 'pre', 'section', 'table', 'tr', 'ul'
+}
+
+INLINE_SPACE_PATTERN = re.compile(r'[ \t\r\f\v\u00a0\u200b]+')
+
+
+class HtmlTextExtractor(HTMLParser):
+    """Streaming HTML-to-text converter
+
+    Text is collected as the parser walks the document once: style/script/head
+    content is dropped, entities are decoded and block elements become line breaks.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIPPED_TAGS:
+            self.skip_depth += 1
+        elif tag in BLOCK_TAGS:
+            self.parts.append('\n')
+        elif tag in ('td', 'th'):
+            self.parts.append(' ')
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in BLOCK_TAGS:
+            self.parts.append('\n')
+
+    def handle_endtag(self, tag):
+        if tag in SKIPPED_TAGS:
+            self.skip_depth = max(0, self.skip_depth - 1)
+        elif tag in BLOCK_TAGS:
+            self.parts.append('\n')
+
+    def handle_data(self, data):
+        if not self.skip_depth:
+            self.parts.append(data)
+
+    def text(self):
+        return normalize_whitespace(''.join(self.parts))
+
+
+def normalize_whitespace(text):
+    """Collapse runs of spaces within lines and drop blank lines"""
+    lines = (INLINE_SPACE_PATTERN.sub(' ', line).strip() for line in text.splitlines())
+    return '\n'.join(line for line in lines if line)
+
+
+def html_to_text(html):
+    """Readable plain text from an HTML document"""
+    extractor = HtmlTextExtractor()
+    extractor.feed(html)
+    extractor.close()
+    return extractor.text()
+
+
+def email_text(email):
+    """Plain-text body of a Graph message, converted once and cached on the message
+
+    Falls back to bodyPreview when the message has no body.
+    """
+    if '_text' not in email:
+        body = email.get('body') or {}
+        content = body.get('content') or ''
+        if not content:
+            text = normalize_whitespace(email.get('bodyPreview') or '')
+        elif body.get('contentType', '').lower() == 'text':
+            text = normalize_whitespace(content)
+        else:
+            text = html_to_text(content)
+        email['_text'] = text
+    return email['_text']
+
+
+# Lines that start the quoted history of a reply: Outlook and Gmail headers, separators, "> " quoting
+QUOTE_MARKER_PATTERN = re.compile(
+    r'^(?:-{2,}\s*Original Message\s*-{2,}'
+    r'|_{10,}'
+    r'|From:[^\n]*\n(?:[^\n]*\n){0,3}?(?:Sent|Date):'
+    r'|On [^\n]{0,200}(?:\n[^\n]{0,200})?wrote:'
+    r'|>)',
+    re.IGNORECASE | re.MULTILINE
+)
+
+
+def split_quoted_reply(text):
+    """Split a reply into (newest message, quoted history)
+
+    Text without a quote marker, or with nothing above the first marker, is returned
+    whole as the newest message.
+    """
+    match = QUOTE_MARKER_PATTERN.search(text)
+    if not match:
+        return text, ''
+    newest = text[:match.start()].strip()
+    if not newest:
+        return text, ''
+    return newest, text[match.start():].strip()
+
+
+def email_reply_parts(email):
+    """(newest message, quoted history) of a message's text, cached on the message"""
+    if '_reply_parts' not in email:
+        email['_reply_parts'] = split_quoted_reply(email_text(email))
+    return email['_reply_parts']
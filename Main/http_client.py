@@ -0,0 +1,125 @@
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class _HttpxResponse:
+    """Adapts an httpx response to the parts of the requests API used in this project"""
+
+    def __init__(self, response):
+        self._response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.url = str(response.url)
+
+    @property
+    def text(self):
+        return self._response.text
+
+    @property
+    def content(self):
+        return self._response.content
+
+    def json(self):
+        return self._response.json()
+
+    def raise_for_status(self):
+        if 400 <= self.status_code < 600:
+            raise requests.exceptions.HTTPError(
+                f"{self.status_code} Error for url: {self.url}",
+                response=self
+            )
+
+
+class HttpClient:
+    """Shared HTTP transport with keep-alive connection pools, gzip and default timeouts
+
+    Uses a pooled requests.Session by default. With HTTP2_ENABLED=true and httpx[http2]
+    installed, requests go through a single HTTP/2 httpx client instead. Either way
+    callers get requests-style responses and requests exceptions.
+    """
+
+    def __init__(self, connect_timeout=None, read_timeout=None, pool_size=None, http2=None):
+        if connect_timeout is None:
+            connect_timeout = float(os.getenv('HTTP_CONNECT_TIMEOUT', '5'))
+        if read_timeout is None:
+            read_timeout = float(os.getenv('HTTP_READ_TIMEOUT', '60'))
+        if pool_size is None:
+            pool_size = int(os.getenv('HTTP_POOL_SIZE', '10'))
+        if http2 is None:
+            http2 = os.getenv('HTTP2_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = None
+        self.httpx_client = None
+
+        if http2:
+            try:
+                import httpx
+                self.httpx_client = httpx.Client(
+                    http2=True,
+                    timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+                    limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+                    headers={'Accept-Encoding': 'gzip, deflate'}
+                )
+            except ImportError as e:
+                print(f"Warning: HTTP/2 unavailable ({e}), falling back to HTTP/1.1 connection pool")
+
+        if self.httpx_client is None:
+            self.session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            self.session.mount('https://', adapter)
+            self.session.mount('http://', adapter)
+            self.session.headers['Accept-Encoding'] = 'gzip, deflate'
+
+    def request(self, method, url, **kwargs):
+        """Send a request using the shared connection pool"""
+        timeout = kwargs.pop('timeout', self.timeout)
+
+        if self.session is not None:
+            return self.session.request(method, url, timeout=timeout, **kwargs)
+
+        import httpx
+        if isinstance(timeout, tuple):
+            timeout = httpx.Timeout(timeout[1], connect=timeout[0])
+        try:
+            response = self.httpx_client.request(method, url, timeout=timeout, **kwargs)
+        except httpx.ConnectTimeout as e:
+            raise requests.exceptions.ConnectTimeout(str(e))
+        except httpx.TimeoutException as e:
+            raise requests.exceptions.ReadTimeout(str(e))
+        except httpx.HTTPError as e:
+            raise requests.exceptions.ConnectionError(str(e))
+        return _HttpxResponse(response)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def patch(self, url, **kwargs):
+        return self.request('PATCH', url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request('DELETE', url, **kwargs)
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+        if self.httpx_client is not None:
+            self.httpx_client.close()
+
+
+_shared_client = None
+_shared_client_lock = threading.Lock()
+
+
+def get_http_client():
+    """Return the process-wide HttpClient, creating it on first use"""
+    global _shared_client
+    with _shared_client_lock:
+        if _shared_client is None:
+            _shared_client = HttpClient()
+        return _shared_client
@@ -0,0 +1,148 @@
+import os
+import time
+import sqlite3
+import threading
+from state_store import state_path
+
+
+class ProcessedLedger:
+    """Durable record of processed emails/transcripts plus named checkpoints
+
+    An item is claimed ('pending') before it is analyzed and marked 'done' once its
+    todos are saved. Items left pending by a crash are handed back on the next start,
+    and claims older than claim_timeout on every poll, so an item whose processing
+    failed is retried instead of being skipped until a restart. A handed-back item
+    stays pending (with a fresh claim time) until it is completed, so a retry that
+    fails in turn is handed back again; after max_attempts it is marked 'failed'.
+    Finished entries are kept for retention_days.
+    """
+
+    def __init__(self, db_path=None, claim_timeout=None, retention_days=None, max_attempts=None):
+        if claim_timeout is None:
+            claim_timeout = float(os.getenv('LEDGER_CLAIM_TIMEOUT', '900'))
+        if retention_days is None:
+            retention_days = float(os.getenv('LEDGER_RETENTION_DAYS', '30'))
+        if max_attempts is None:
+            max_attempts = int(os.getenv('LEDGER_MAX_ATTEMPTS', '5'))
+        self.claim_timeout = claim_timeout
+        self.retention_days = retention_days
+        self.max_attempts = max_attempts
+        self.db_path = db_path or state_path('ledger.sqlite3')
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS processed ("
+                "kind TEXT, item_id TEXT, status TEXT, claimed_at REAL, completed_at REAL, "
+                "PRIMARY KEY (kind, item_id))"
+            )
+            self._conn.execute("CREATE TABLE IF NOT EXISTS checkpoints (name TEXT PRIMARY KEY, value TEXT)")
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(processed)")]
+            if 'attempts' not in columns:
+                # Ledgers created before retries were counted
+                self._conn.execute("ALTER TABLE processed ADD COLUMN attempts INTEGER DEFAULT 0")
+            self._conn.commit()
+
+    def claim(self, kind, item_id):
+        """Mark an item as in progress; False if it was already claimed or processed"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO processed (kind, item_id, status, claimed_at) VALUES (?, ?, 'pending', ?)",
+                (kind, item_id, time.time())
+            )
+            self._conn.commit()
+            return cursor.rowcount == 1
+
+    def complete(self, kind, item_id):
+        """Mark a claimed item as fully processed"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE processed SET status = 'done', completed_at = ? WHERE kind = ? AND item_id = ?",
+                (time.time(), kind, item_id)
+            )
+            self._conn.commit()
+
+    def is_processed(self, kind, item_id):
+        """Check whether an item has been claimed or processed"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM processed WHERE kind = ? AND item_id = ?", (kind, item_id)
+            ).fetchone()
+            return row is not None
+
+    def recover_pending(self, kind, stale_only=False):
+        """Hand back claimed but unfinished items, and return their IDs
+
+        At startup every pending claim is left over from the previous run. With
+        stale_only, only claims older than claim_timeout are handed back - younger
+        ones may still be in progress. The items stay pending under a fresh claim
+        time, so they are handed back again if the caller fails before completing
+        them; release() drops one that no longer exists.
+        """
+        now = time.time()
+        cutoff = now - self.claim_timeout if stale_only else float('inf')
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT item_id, COALESCE(attempts, 0) FROM processed "
+                "WHERE kind = ? AND status = 'pending' AND claimed_at < ? ORDER BY claimed_at",
+                (kind, cutoff)
+            ).fetchall()
+            recovered = []
+            for item_id, attempts in rows:
+                if attempts >= self.max_attempts:
+                    print(f"Giving up on {kind} {item_id} after {attempts} failed retries")
+                    self._conn.execute(
+                        "UPDATE processed SET status = 'failed', completed_at = ? WHERE kind = ? AND item_id = ?",
+                        (now, kind, item_id)
+                    )
+                    continue
+                self._conn.execute(
+                    "UPDATE processed SET claimed_at = ?, attempts = ? WHERE kind = ? AND item_id = ?",
+                    (now, attempts + 1, kind, item_id)
+                )
+                recovered.append(item_id)
+            self._conn.commit()
+            return recovered
+
+    def release(self, kind, item_id):
+        """Forget a claimed item entirely, e.g. because it no longer exists"""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM processed WHERE kind = ? AND item_id = ? AND status = 'pending'", (kind, item_id)
+            )
+            self._conn.commit()
+
+    def prune(self, older_than_days=None):
+        """Drop finished entries older than the given age (default retention_days)"""
+        if older_than_days is None:
+            older_than_days = self.retention_days
+        cutoff = time.time() - older_than_days * 86400
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM processed WHERE status IN ('done', 'failed') AND completed_at < ?", (cutoff,)
+            )
+            self._conn.commit()
+
+    def get_checkpoint(self, name, default=None):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM checkpoints WHERE name = ?", (name,)).fetchone()
+            return row[0] if row else default
+
+    def set_checkpoint(self, name, value):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO checkpoints VALUES (?, ?)", (name, value))
+            self._conn.commit()
+
+
+_shared_ledger = None
+_shared_ledger_lock = threading.Lock()
+
+
+def get_ledger():
+    """Return the process-wide ProcessedLedger"""
+    global _shared_ledger
+    with _shared_ledger_lock:
+        if _shared_ledger is None:
+            _shared_ledger = ProcessedLedger()
+        return _shared_ledger
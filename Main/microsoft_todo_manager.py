@@ -1,50 +1,148 @@
 import os
+import time
+import threading
 import requests
-import msal
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
+from http_client import get_http_client
+from graph_auth import get_token_provider
+from task_title_index import TaskTitleIndex, normalize_title
+from state_store import state_path, load_json, save_json
 
 load_dotenv()
 
+# Maximum number of sub-requests Graph accepts in one JSON $batch
+GRAPH_BATCH_LIMIT = 20
+
+
+class TaskListCache:
+    """Task list name -> id mapping persisted on disk and shared by every manager instance
+
+    Entries are only dropped when Graph answers 404 for the cached list id.
+    """
+    
+    def __init__(self, cache_file=None):
+        self.cache_file = cache_file or state_path('todo_lists.json')
+        self.lists = load_json(self.cache_file, {})
+        self._lock = threading.Lock()
+    
+    def get(self, list_name):
+        with self._lock:
+            return self.lists.get(list_name)
+    
+    def set(self, list_name, list_id):
+        with self._lock:
+            if self.lists.get(list_name) != list_id:
+                self.lists[list_name] = list_id
+                save_json(self.cache_file, self.lists)
+    
+    def invalidate(self, list_id):
+        """Forget every name that points at a list Graph no longer knows"""
+        with self._lock:
+            stale = [name for name, cached_id in self.lists.items() if cached_id == list_id]
+            for name in stale:
+                del self.lists[name]
+            if stale:
+                save_json(self.cache_file, self.lists)
+
+
+_shared_list_cache = None
+_shared_list_cache_lock = threading.Lock()
+
+
+def get_task_list_cache():
+    """Return the process-wide TaskListCache, loading it on first use"""
+    global _shared_list_cache
+    with _shared_list_cache_lock:
+        if _shared_list_cache is None:
+            _shared_list_cache = TaskListCache()
+        return _shared_list_cache
+
+
+class StreamedTodoBatch:
+    """Buffers the todos streamed from one analysis and uploads them in small batches
+
+    A batch is sent once batch_size todos are waiting, or when a todo arrives
+    flush_seconds after the oldest waiting one; flush() sends the rest when the
+    stream ends. Only the first upload syncs the duplicate-title index - later
+    ones reuse it, since the manager adds every task it creates to the index.
+    """
+    
+    def __init__(self, manager, list_name=None, batch_size=None, flush_seconds=None):
+        if batch_size is None:
+            batch_size = int(os.getenv('TODO_STREAM_BATCH_SIZE', '5'))
+        if flush_seconds is None:
+            flush_seconds = float(os.getenv('TODO_STREAM_FLUSH_SECONDS', '2'))
+        self.manager = manager
+        self.list_name = list_name
+        self.batch_size = max(1, batch_size)
+        self.flush_seconds = flush_seconds
+        self.pending = []
+        self.oldest = None
+        self.synced = False
+    
+    def add(self, todo):
+        self.pending.append(todo)
+        if self.oldest is None:
+            self.oldest = time.monotonic()
+        if len(self.pending) >= self.batch_size or time.monotonic() - self.oldest >= self.flush_seconds:
+            self.flush()
+    
+    def flush(self):
+        """Upload every waiting todo; failures are left for the regular upload"""
+        todos, self.pending, self.oldest = self.pending, [], None
+        if not todos:
+            return
+        try:
+            self.manager.add_structured_todos(todos, self.list_name, sync_index=not self.synced)
+            self.synced = True
+        except Exception as e:
+            print(f"❌ Error uploading streamed tasks to Microsoft To Do: {e}")
+
+
 class MicrosoftTodoManager:
-    def __init__(self):
-        self.client_id = os.getenv('CLIENT_ID')
-        self.client_secret = os.getenv('CLIENT_SECRET')
-        self.tenant_id = os.getenv('TENANT_ID')
+    def __init__(self, http_client=None, token_provider=None, list_cache=None):
         self.user_email = os.getenv('USER_EMAIL')
         
-        self.authority = f"https://login.microsoftonline.com/{self.tenant_id}"
-        self.scope = ["https://graph.microsoft.com/.default"]
         self.graph_url = "https://graph.microsoft.com/v1.0"
         
-        # Initialize MSAL app
-        self.app = msal.ConfidentialClientApplication(
-            self.client_id,
-            authority=self.authority,
-            client_credential=self.client_secret
-        )
+        # Shared pooled HTTP transport for Graph calls
+        self.http = http_client or get_http_client()
+        
+        # Shared Graph token cache - avoids an MSAL round trip per request
+        self.token_provider = token_provider or get_token_provider()
         
         # Default list name
         self.default_list_name = "Email Tasks"
         self.default_list_id = None
+        
+        # Persistent list name -> id cache, shared with every other manager in the process
+        self.list_cache = list_cache or get_task_list_cache()
+        
+        # Duplicate-title indexes per list id, kept current with To Do delta sync
+        self.title_indexes = {}
+        
+        # Attempts for throttled or failed sub-requests of a $batch
+        self.batch_max_retries = int(os.getenv('TODO_BATCH_MAX_RETRIES', '3'))
+        
+        # Todos may be added from several analysis threads at once (streamed items) -
+        # the list lookup, duplicate index and upload run one call at a time
+        self._lock = threading.RLock()
     
     def get_access_token(self):
         """Get access token for Graph API"""
-        result = self.app.acquire_token_silent(self.scope, account=None)
-        if not result:
-            result = self.app.acquire_token_for_client(scopes=self.scope)
-        
-        if "access_token" in result:
-            return result['access_token']
-        else:
-            print(f"Error getting token: {result.get('error')}")
-            print(f"Description: {result.get('error_description')}")
-            return None
+        return self.token_provider.get_token()
     
     def get_or_create_task_list(self, list_name=None):
         """Get or create a task list in Microsoft To Do"""
         if list_name is None:
             list_name = self.default_list_name
+        
+        cached_id = self.list_cache.get(list_name)
+        if cached_id:
+            if list_name == self.default_list_name:
+                self.default_list_id = cached_id
+            return cached_id
             
         token = self.get_access_token()
         if not token:
@@ -59,7 +157,7 @@ class MicrosoftTodoManager:
         endpoint = f"{self.graph_url}/users/{self.user_email}/todo/lists"
         
         try:
-            response = requests.get(endpoint, headers=headers)
+            response = self.http.get(endpoint, headers=headers)
             response.raise_for_status()
             
             lists = response.json().get('value', [])
@@ -69,6 +167,7 @@ class MicrosoftTodoManager:
                 if task_list.get('displayName') == list_name:
                     print(f"Found existing task list: {list_name}")
                     self.default_list_id = task_list['id']
+                    self.list_cache.set(list_name, task_list['id'])
                     return task_list['id']
             
             # Create new list if it doesn't exist
@@ -76,12 +175,13 @@ class MicrosoftTodoManager:
                 "displayName": list_name
             }
             
-            response = requests.post(endpoint, headers=headers, json=create_data)
+            response = self.http.post(endpoint, headers=headers, json=create_data)
             response.raise_for_status()
             
             new_list = response.json()
             print(f"Created new task list: {list_name}")
             self.default_list_id = new_list['id']
+            self.list_cache.set(list_name, new_list['id'])
             return new_list['id']
             
         except requests.exceptions.RequestException as e:
@@ -90,25 +190,36 @@ class MicrosoftTodoManager:
                 print(f"Response: {e.response.text}")
             return None
     
-    def add_task(self, title, body=None, importance="normal", due_date=None, list_id=None):
-        """Add a task to Microsoft To Do"""
-        token = self.get_access_token()
-        if not token:
-            return False
-        
-        # Get or create list if not specified
+    def invalidate_task_list(self, list_id):
+        """Drop a list id that Graph reported as not found from every cache"""
+        print(f"Task list {list_id} no longer exists, clearing cached id")
+        self.list_cache.invalidate(list_id)
+        self.title_indexes.pop(list_id, None)
+        if self.default_list_id == list_id:
+            self.default_list_id = None
+    
+    def create_tasks_in_list(self, task_payloads, list_name=None, list_id=None, title_index=None):
+        """Batch-create tasks, re-resolving the list once if its cached id has gone stale"""
         if list_id is None:
-            list_id = self.get_or_create_task_list()
+            list_id = self.get_or_create_task_list(list_name)
             if not list_id:
-                print("Failed to get task list")
-                return False
+                return []
         
-        headers = {
-            'Authorization': f'Bearer {token}',
-            'Content-Type': 'application/json'
-        }
+        results = self.create_tasks_batch(task_payloads, list_id, title_index)
         
-        # Build task data
+        missing = [index for index, result in enumerate(results) if result['status'] == 404]
+        if missing:
+            self.invalidate_task_list(list_id)
+            list_id = self.get_or_create_task_list(list_name)
+            if list_id:
+                retried = self.create_tasks_batch([task_payloads[index] for index in missing], list_id)
+                for index, result in zip(missing, retried):
+                    results[index] = result
+        
+        return results
+    
+    def build_task_data(self, title, body=None, importance="normal", due_date=None):
+        """Build the Graph payload for a new To Do task"""
         task_data = {
             "title": title,
             "importance": importance  # low, normal, high
@@ -128,11 +239,35 @@ class MicrosoftTodoManager:
                 "timeZone": "UTC"
             }
         
+        return task_data
+    
+    def add_task(self, title, body=None, importance="normal", due_date=None, list_id=None):
+        """Add a task to Microsoft To Do"""
+        token = self.get_access_token()
+        if not token:
+            return False
+        
+        # Get or create list if not specified
+        if list_id is None:
+            list_id = self.get_or_create_task_list()
+            if not list_id:
+                print("Failed to get task list")
+                return False
+        
+        headers = {
+            'Authorization': f'Bearer {token}',
+            'Content-Type': 'application/json'
+        }
+        
+        task_data = self.build_task_data(title, body, importance, due_date)
+        
         # Create the task
         endpoint = f"{self.graph_url}/users/{self.user_email}/todo/lists/{list_id}/tasks"
         
         try:
-            response = requests.post(endpoint, headers=headers, json=task_data)
+            response = self.http.post(endpoint, headers=headers, json=task_data)
+            if response.status_code == 404:
+                self.invalidate_task_list(list_id)
             response.raise_for_status()
             
             task = response.json()
@@ -145,6 +280,144 @@ class MicrosoftTodoManager:
                 print(f"Response: {e.response.text}")
             return False
     
+    def create_tasks_batch(self, task_payloads, list_id, title_index=None):
+        """Create tasks with Graph JSON batching, up to 20 tasks per request
+        
+        Returns one result dict per payload, in order, with 'list_id', 'status'
+        (HTTP status of the sub-request, or None if it was never answered), 'task'
+        on success and 'error' on failure. Throttled (429) and server-error sub-requests are
+        retried on their own; successful ones are never resent.
+        
+        A whole batch is resent only when Graph cannot have processed it: a failed
+        connection or a 429/5xx answer to the envelope. After a read timeout the
+        tasks may already exist, so the batch is resent only with the list's
+        title_index, re-synced first; tasks found in it get 'existing' set instead
+        of being created twice.
+        """
+        results = [{'title': payload.get('title', ''), 'list_id': list_id, 'status': None, 'task': None,
+                    'error': None, 'existing': False}
+                   for payload in task_payloads]
+        pending = list(range(len(task_payloads)))
+        uncertain = []
+        
+        for attempt in range(self.batch_max_retries + 1):
+            # Tasks whose batch timed out may have been created - check before sending them again
+            if uncertain:
+                self.sync_task_index(title_index)
+                for index in uncertain:
+                    if title_index.contains(results[index]['title']):
+                        results[index]['existing'] = True
+                        results[index]['error'] = None
+                pending = [index for index in pending if not results[index]['existing']]
+                uncertain = []
+            
+            if not pending:
+                break
+            
+            token = self.get_access_token()
+            if not token:
+                for index in pending:
+                    results[index]['error'] = 'No access token'
+                break
+            
+            headers = {
+                'Authorization': f'Bearer {token}',
+                'Content-Type': 'application/json'
+            }
+            
+            retry_indexes = []
+            retry_after = 0
+            
+            for chunk_start in range(0, len(pending), GRAPH_BATCH_LIMIT):
+                chunk = pending[chunk_start:chunk_start + GRAPH_BATCH_LIMIT]
+                batch_body = {
+                    "requests": [
+                        {
+                            "id": str(index),
+                            "method": "POST",
+                            "url": f"/users/{self.user_email}/todo/lists/{list_id}/tasks",
+                            "headers": {"Content-Type": "application/json"},
+                            "body": task_payloads[index]
+                        }
+                        for index in chunk
+                    ]
+                }
+                
+                try:
+                    response = self.http.post(f"{self.graph_url}/$batch", headers=headers, json=batch_body)
+                    response.raise_for_status()
+                    responses = response.json().get('responses', [])
+                except requests.exceptions.HTTPError as e:
+                    print(f"Error sending task batch: {e}")
+                    for index in chunk:
+                        results[index]['error'] = str(e)
+                    # The envelope was rejected as a whole - only throttling and server errors are worth resending
+                    status = e.response.status_code if e.response is not None else None
+                    if status is not None and (status == 429 or status >= 500):
+                        retry_indexes.extend(chunk)
+                        try:
+                            retry_after = max(retry_after, int(e.response.headers.get('Retry-After', 0)))
+                        except (TypeError, ValueError):
+                            pass
+                    continue
+                except requests.exceptions.ConnectionError as e:
+                    # Never reached Graph - safe to resend
+                    print(f"Error sending task batch: {e}")
+                    for index in chunk:
+                        results[index]['error'] = str(e)
+                    retry_indexes.extend(chunk)
+                    continue
+                except requests.exceptions.RequestException as e:
+                    # Read timeout and the like - Graph may have created the tasks already
+                    print(f"Error sending task batch: {e}")
+                    for index in chunk:
+                        results[index]['error'] = str(e)
+                    if title_index is not None:
+                        uncertain.extend(chunk)
+                        retry_indexes.extend(chunk)
+                    continue
+                
+                answered = set()
+                for sub_response in responses:
+                    index = int(sub_response.get('id'))
+                    status = sub_response.get('status')
+                    answered.add(index)
+                    results[index]['status'] = status
+                    
+                    if status is not None and 200 <= status < 300:
+                        results[index]['task'] = sub_response.get('body')
+                        results[index]['error'] = None
+                    elif status == 429 or (status is not None and status >= 500):
+                        results[index]['error'] = f"HTTP {status} (will retry)"
+                        retry_indexes.append(index)
+                        sub_headers = sub_response.get('headers') or {}
+                        try:
+                            retry_after = max(retry_after, int(sub_headers.get('Retry-After', 0)))
+                        except (TypeError, ValueError):
+                            pass
+                    else:
+                        error = (sub_response.get('body') or {}).get('error', {})
+                        results[index]['error'] = error.get('message') or f"HTTP {status}"
+                
+                # Sub-requests missing from the response are treated as retryable
+                retry_indexes.extend(index for index in chunk if index not in answered)
+            
+            pending = sorted(retry_indexes)
+            if pending and attempt < self.batch_max_retries:
+                delay = retry_after or min(2 ** attempt, 30)
+                print(f"Retrying {len(pending)} throttled/failed task(s) in {delay}s...")
+                time.sleep(delay)
+        
+        for result in results:
+            if result['task'] is not None:
+                print(f"✅ Added task to Microsoft To Do: {result['title']}")
+            elif result['existing']:
+                print(f"✅ Task was created before its batch timed out: {result['title']}")
+            else:
+                print(f"❌ Failed to add task '{result['title']}': {result['error']}")
+        
+        return results
+    
     def add_tasks_batch(self, tasks, list_name=None):
         """Add multiple tasks to Microsoft To Do"""
         # Get or create list
@@ -153,7 +426,7 @@ class MicrosoftTodoManager:
             print("Failed to get task list")
             return False
         
-        success_count = 0
+        task_payloads = []
         for task in tasks:
             if isinstance(task, dict):
                 title = task.get('action', task.get('title', ''))
@@ -168,74 +441,135 @@ class MicrosoftTodoManager:
                 due_date = None
             
             if title:
-                result = self.add_task(title, body, importance, due_date, list_id)
-                if result:
-                    success_count += 1
+                task_payloads.append(self.build_task_data(title, body, importance, due_date))
+        
+        results = self.create_tasks_in_list(task_payloads, list_name, list_id)
+        success_count = sum(1 for result in results if result['task'] is not None)
         
         print(f"Successfully added {success_count}/{len(tasks)} tasks to Microsoft To Do")
         return success_count > 0
     
-    def check_duplicate_task(self, title, list_id=None):
-        """Check if a task with the same title already exists"""
+    def get_task_index(self, list_id, sync=True):
+        """Return the duplicate-title index for a list, synced with To Do delta
+        
+        With sync=False an index already loaded in this process is returned as is.
+        """
+        index = self.title_indexes.get(list_id)
+        if index is None:
+            index = TaskTitleIndex(list_id)
+            self.title_indexes[list_id] = index
+            sync = True
+        
+        if sync:
+            self.sync_task_index(index)
+        return index
+    
+    def sync_task_index(self, index):
+        """Apply task changes since the last sync to a title index"""
         token = self.get_access_token()
         if not token:
-            return False
-        
-        if list_id is None:
-            list_id = self.default_list_id or self.get_or_create_task_list()
-            if not list_id:
-                return False
+            return
         
         headers = {
             'Authorization': f'Bearer {token}',
             'Content-Type': 'application/json'
         }
         
-        # Get all tasks in the list
-        endpoint = f"{self.graph_url}/users/{self.user_email}/todo/lists/{list_id}/tasks"
+        url = index.delta_link or f"{self.graph_url}/users/{self.user_email}/todo/lists/{index.list_id}/tasks/delta"
         
+        changed = index.delta_link is None
         try:
-            response = requests.get(endpoint, headers=headers)
-            response.raise_for_status()
-            
-            tasks = response.json().get('value', [])
+            # Follow every page so tasks past the first page are indexed too
+            while url:
+                response = self.http.get(url, headers=headers)
+                
+                if response.status_code == 404:
+                    self.invalidate_task_list(index.list_id)
+                    return
+                
+                # Sync state expired - rebuild the index from a full download
+                if response.status_code == 410 and index.delta_link:
+                    print("Task list delta token expired, rebuilding title index")
+                    index.reset()
+                    changed = True
+                    url = f"{self.graph_url}/users/{self.user_email}/todo/lists/{index.list_id}/tasks/delta"
+                    continue
+                
+                response.raise_for_status()
+                data = response.json()
+                
+                for task in data.get('value', []):
+                    index.apply_change(task)
+                    changed = True
+                
+                url = data.get('@odata.nextLink')
+                if not url and data.get('@odata.deltaLink'):
+                    index.delta_link = data['@odata.deltaLink']
             
-            # Check for duplicates (case-insensitive)
-            title_lower = title.lower().strip()
-            for task in tasks:
-                if task.get('title', '').lower().strip() == title_lower:
-                    # Only consider incomplete tasks as duplicates
-                    if task.get('status') != 'completed':
-                        return True
-            
-            return False
+            # An unchanged list needs no rewrite - the saved delta link still yields the same changes
+            if changed:
+                index.save()
             
         except requests.exceptions.RequestException as e:
-            print(f"Error checking for duplicate: {e}")
-            return False
+            print(f"Error syncing task title index: {e}")
     
-    def add_structured_todos(self, structured_todos, list_name=None):
-        """Add structured todos with metadata to Microsoft To Do"""
+    def check_duplicate_task(self, title, list_id=None):
+        """Check if a task with the same title already exists"""
+        if list_id is None:
+            list_id = self.default_list_id or self.get_or_create_task_list()
+            if not list_id:
+                return False
+        
+        # Check for duplicates (case-insensitive) against the local index
+        return self.get_task_index(list_id).contains(title)
+    
+    def add_structured_todos(self, structured_todos, list_name=None, sync_index=True):
+        """Add structured todos with metadata to Microsoft To Do - safe to call from any thread
+        
+        Todos that are in To Do afterwards, created now or skipped as duplicates, are
+        flagged with uploaded_to_todo. sync_index=False skips the delta sync of the
+        duplicate index when the caller synced it moments ago.
+        """
         if not structured_todos:
             return False
         
+        with self._lock:
+            return self._add_structured_todos(structured_todos, list_name, sync_index)
+    
+    def _add_structured_todos(self, structured_todos, list_name, sync_index):
+        
         # Get or create list
         list_id = self.get_or_create_task_list(list_name)
         if not list_id:
             print("Failed to get task list")
             return False
         
-        success_count = 0
+        # One delta sync covers the duplicate check for the whole batch
+        title_index = self.get_task_index(list_id, sync=sync_index)
+        if list_id not in self.title_indexes:
+            # The cached list id was stale (404 during sync) - resolve the list again
+            list_id = self.get_or_create_task_list(list_name)
+            if not list_id:
+                print("Failed to get task list")
+                return False
+            title_index = self.get_task_index(list_id)
+        batch_titles = set()
+        
+        task_payloads = []
+        payload_todos = []
         skipped_count = 0
         
         for todo in structured_todos:
             title = todo.get('action', '')
             
-            # Check for duplicate
-            if self.check_duplicate_task(title, list_id):
+            # Check for duplicate, including repeats within this batch
+            title_key = normalize_title(title)
+            if title_index.contains(title) or title_key in batch_titles:
                 print(f"⏭️  Skipping duplicate task: {title}")
+                todo['uploaded_to_todo'] = True
                 skipped_count += 1
                 continue
+            batch_titles.add(title_key)
             
             # Build detailed body with metadata
             body_parts = []
@@ -260,10 +594,22 @@ class MicrosoftTodoManager:
             if any(word in title.lower() for word in ['urgent', 'asap', 'critical', 'important']):
                 importance = "high"
             
-            # Add the task
-            result = self.add_task(title, body, importance, None, list_id)
-            if result:
+            task_payloads.append(self.build_task_data(title, body, importance, None))
+            payload_todos.append(todo)
+        
+        # Add the tasks - one $batch round trip per 20 tasks
+        results = self.create_tasks_in_list(task_payloads, list_name, list_id, title_index) if task_payloads else []
+        success_count = 0
+        for todo, result in zip(payload_todos, results):
+            if result['task'] is not None:
+                success_count += 1
+                todo['uploaded_to_todo'] = True
+                # The list is re-resolved if it was deleted meanwhile - index the one the task is in.
+                # Not saved: the next delta sync returns these tasks again and saves once per sync
+                self.get_task_index(result['list_id'], sync=False).add(result['task'].get('id', ''), result['title'])
+            elif result['existing']:
                 success_count += 1
+                todo['uploaded_to_todo'] = True
         
         print(f"\n📊 Summary: Added {success_count} new tasks, skipped {skipped_count} duplicates")
-        return success_count > 0
\ No newline at end of file
+        return success_count > 0
@@ -0,0 +1,72 @@
+import os
+import threading
+
+COMPLEXITY_LEVELS = ('none', 'simple', 'complex')
+
+
+class ModelRouter:
+    """Chooses the Claude model per email and keeps per-tier metrics
+
+    Emails first go to a small, fast triage model that classifies them as none,
+    simple or complex and extracts the simple ones itself. Complex emails, and
+    any prompt longer than escalate_chars, go to the escalation model.
+    """
+
+    def __init__(self, triage_model=None, escalation_model=None, enabled=None, escalate_chars=None):
+        if triage_model is None:
+            triage_model = os.getenv('TRIAGE_MODEL', 'claude-3-5-haiku-20241022')
+        if escalation_model is None:
+            escalation_model = os.getenv('ESCALATION_MODEL', 'claude-opus-4-20250514')
+        if enabled is None:
+            enabled = os.getenv('MODEL_ROUTING_ENABLED', 'true').lower() == 'true'
+        if escalate_chars is None:
+            escalate_chars = int(os.getenv('ROUTER_ESCALATE_CHARS', '6000'))
+        self.triage_model = triage_model
+        self.escalation_model = escalation_model
+        self.enabled = enabled
+        self.escalate_chars = escalate_chars
+
+        self._lock = threading.Lock()
+        self.tiers = {
+            tier: {'calls': 0, 'seconds': 0.0, 'input_tokens': 0, 'output_tokens': 0}
+            for tier in ('triage', 'escalation')
+        }
+        self.decisions = {level: 0 for level in COMPLEXITY_LEVELS + ('long', 'unparsed')}
+
+    def should_triage(self, content):
+        """False when the email goes straight to the escalation model"""
+        if not self.enabled:
+            return False
+        if len(content) > self.escalate_chars:
+            self.count_decision('long')
+            return False
+        return True
+
+    def count_decision(self, decision):
+        with self._lock:
+            self.decisions[decision] += 1
+
+    def record(self, tier, seconds, usage):
+        """Add one call's latency and token usage to a tier's totals"""
+        with self._lock:
+            totals = self.tiers[tier]
+            totals['calls'] += 1
+            totals['seconds'] += seconds
+            if usage is not None:
+                totals['input_tokens'] += (usage.input_tokens
+                                           + (getattr(usage, 'cache_read_input_tokens', 0) or 0)
+                                           + (getattr(usage, 'cache_creation_input_tokens', 0) or 0))
+                totals['output_tokens'] += usage.output_tokens
+
+    def stats(self):
+        with self._lock:
+            tiers = {
+                tier: {
+                    'calls': totals['calls'],
+                    'avg_seconds': round(totals['seconds'] / totals['calls'], 2) if totals['calls'] else 0.0,
+                    'input_tokens': totals['input_tokens'],
+                    'output_tokens': totals['output_tokens']
+                }
+                for tier, totals in self.tiers.items()
+            }
+            return {'tiers': tiers, 'decisions': dict(self.decisions)}
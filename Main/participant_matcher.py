@@ -0,0 +1,115 @@
+import os
+import re
+import bisect
+from filter_rules import trie_pattern
+
+
+def _split_list(value):
+    return [item.strip() for item in (value or '').split(',') if item.strip()]
+
+
+class ParticipantMatcher:
+    """Finds the transcript sentences that involve the user, with surrounding context
+
+    The user is recognized by name, aliases, the handle of their email address
+    (e.g. "jane.doe" and "jane doe") and Fireflies speaker IDs. All names are
+    compiled into one word-bounded regex that runs once over the whole transcript.
+    """
+
+    def __init__(self, user_name=None, aliases=None, user_email=None, speaker_ids=None, context_sentences=None):
+        if user_email is None:
+            user_email = os.getenv('USER_EMAIL', '')
+        handle = user_email.split('@', 1)[0].lower() if user_email else ''
+        if user_name is None:
+            user_name = os.getenv('USER_NAME')
+            if user_name:
+                print(f"Matching transcripts for user name: {user_name}")
+            else:
+                user_name = re.split(r'[._-]', handle)[0].capitalize() or 'Me'
+                source = "guessed from the email address" if handle else "a placeholder"
+                print(f"WARNING: USER_NAME is not set - matching transcripts for '{user_name}' ({source}). "
+                      f"Set USER_NAME if that is wrong")
+        if aliases is None:
+            aliases = _split_list(os.getenv('USER_ALIASES'))
+        if speaker_ids is None:
+            speaker_ids = _split_list(os.getenv('FIREFLIES_SPEAKER_IDS'))
+        if context_sentences is None:
+            context_sentences = int(os.getenv('FIREFLIES_CONTEXT_SENTENCES', '2'))
+
+        self.user_name = user_name
+        self.speaker_ids = {str(speaker_id) for speaker_id in speaker_ids}
+        self.context_sentences = context_sentences
+
+        names = {user_name.lower(), *(alias.lower() for alias in aliases)}
+        if handle:
+            names.add(handle)
+            names.add(re.sub(r'[._-]+', ' ', handle))
+        self.names = sorted(name for name in names if name)
+        # No leading \b - it would stop the regex engine from scanning for the literal
+        # prefix; the start boundary is checked on each (rare) match instead
+        self.pattern = re.compile(trie_pattern(self.names) + r'\b')
+
+        # Speakers repeat on every sentence - each distinct name is checked once
+        self._speaker_cache = {}
+
+    def _find(self, text):
+        """Start offsets of whole-word name matches in lowercased text"""
+        return [match.start() for match in self.pattern.finditer(text)
+                if match.start() == 0 or not (text[match.start() - 1].isalnum() or text[match.start() - 1] == '_')]
+
+    def mentions(self, text):
+        """True if the text mentions the user"""
+        return bool(text) and bool(self._find(text.lower()))
+
+    def is_user_speaker(self, sentence):
+        if str(sentence.get('speaker_id')) in self.speaker_ids:
+            return True
+        speaker = sentence.get('speaker_name') or ''
+        if speaker not in self._speaker_cache:
+            self._speaker_cache[speaker] = self.mentions(speaker)
+        return self._speaker_cache[speaker]
+
+    def mention_indexes(self, sentences):
+        """Indexes of the sentences whose text mentions the user"""
+        # One regex pass over the joined text; match offsets map back to sentences
+        texts = [sentence.get('text') or '' for sentence in sentences]
+        starts = []
+        offset = 0
+        for text in texts:
+            starts.append(offset)
+            offset += len(text) + 1
+        joined = '\n'.join(texts).lower()
+
+        return sorted({bisect.bisect_right(starts, offset) - 1 for offset in self._find(joined)})
+
+    def speaker_indexes(self, sentences):
+        """Indexes of the sentences spoken by the user"""
+        return [index for index, sentence in enumerate(sentences) if self.is_user_speaker(sentence)]
+
+    def matching_indexes(self, sentences):
+        """Indexes of the sentences spoken by or mentioning the user"""
+        return sorted(set(self.mention_indexes(sentences)) | set(self.speaker_indexes(sentences)))
+
+    def excerpts(self, sentences, indexes=None):
+        """Matching sentences with context_sentences neighbours on each side
+
+        Overlapping windows are merged. Returns a list of excerpts, each a list of
+        {'speaker', 'text'} dicts in transcript order; empty when nothing matches.
+        Pass precomputed matching indexes to avoid a second scan.
+        """
+        if indexes is None:
+            indexes = self.matching_indexes(sentences)
+        windows = []
+        for index in indexes:
+            start = max(0, index - self.context_sentences)
+            end = min(len(sentences), index + self.context_sentences + 1)
+            if windows and start <= windows[-1][1]:
+                windows[-1][1] = max(windows[-1][1], end)
+            else:
+                windows.append([start, end])
+
+        return [
+            [{'speaker': sentence.get('speaker_name') or 'Unknown', 'text': sentence.get('text') or ''}
+             for sentence in sentences[start:end]]
+            for start, end in windows
+        ]
@@ -0,0 +1,140 @@
+import os
+import re
+import json
+import math
+import random
+import threading
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9']{2,}")
+
+
+def email_features(email):
+    """Bag-of-words features from sender, subject and preview text"""
+    sender = (email.get('from') or {}).get('emailAddress', {}).get('address', '').lower()
+    features = []
+    if sender:
+        features.append(f"from:{sender}")
+        features.append(f"domain:{sender.rsplit('@', 1)[-1]}")
+    features.extend(f"subject:{token}" for token in TOKEN_PATTERN.findall((email.get('subject') or '').lower()))
+    features.extend(TOKEN_PATTERN.findall((email.get('bodyPreview') or '').lower()))
+    return features
+
+
+class ActionabilityClassifier:
+    """Naive Bayes pre-filter that keeps obviously non-actionable mail away from Claude
+
+    It learns online from the outcome of every Claude analysis (did the email yield
+    action items or not), which is appended to decisions.jsonl in structured_todos
+    and replayed at startup. Until both classes have min_examples decisions it lets
+    everything through. A small share of low-scoring mail is still analyzed
+    (explore_rate) so the model keeps receiving labels for what it would skip.
+    """
+
+    def __init__(self, decisions_file, threshold=None, min_examples=None, explore_rate=None):
+        if threshold is None:
+            threshold = float(os.getenv('PRECLASSIFIER_THRESHOLD', '0.1'))
+        if min_examples is None:
+            min_examples = int(os.getenv('PRECLASSIFIER_MIN_EXAMPLES', '30'))
+        if explore_rate is None:
+            explore_rate = float(os.getenv('PRECLASSIFIER_EXPLORE_RATE', '0.05'))
+        self.decisions_file = decisions_file
+        self.threshold = threshold
+        self.min_examples = min_examples
+        self.explore_rate = explore_rate
+
+        # Per-class document counts, token counts and token totals
+        self.doc_counts = [0, 0]
+        self.token_counts = [{}, {}]
+        self.token_totals = [0, 0]
+        self.vocabulary = set()
+        self._lock = threading.Lock()
+
+        # Monitoring counters
+        self.scored = 0
+        self.calls_avoided = 0
+
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.decisions_file):
+            return
+        with open(self.decisions_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    decision = json.loads(line)
+                except ValueError:
+                    continue
+                self._learn(decision['features'], decision['actionable'])
+        print(f"Pre-classifier trained on {sum(self.doc_counts)} decisions "
+              f"({self.doc_counts[1]} actionable)")
+
+    def _learn(self, features, actionable):
+        label = 1 if actionable else 0
+        counts = self.token_counts[label]
+        self.doc_counts[label] += 1
+        for feature in features:
+            counts[feature] = counts.get(feature, 0) + 1
+            self.vocabulary.add(feature)
+        self.token_totals[label] += len(features)
+
+    @property
+    def is_trained(self):
+        return min(self.doc_counts) >= self.min_examples
+
+    def score(self, email):
+        """Probability that an email is actionable, or None while untrained"""
+        if not self.is_trained:
+            return None
+
+        features = email_features(email)
+        with self._lock:
+            vocabulary_size = len(self.vocabulary) + 1
+            log_odds = math.log(self.doc_counts[1] / self.doc_counts[0])
+            negative, positive = self.token_counts
+            negative_total = self.token_totals[0] + vocabulary_size
+            positive_total = self.token_totals[1] + vocabulary_size
+            for feature in features:
+                # Laplace-smoothed per-token log likelihood ratio
+                log_odds += math.log((positive.get(feature, 0) + 1) / positive_total)
+                log_odds -= math.log((negative.get(feature, 0) + 1) / negative_total)
+
+        log_odds = max(-30.0, min(30.0, log_odds))
+        return 1.0 / (1.0 + math.exp(-log_odds))
+
+    def should_analyze(self, email):
+        """Decide whether an email is worth a Claude call"""
+        score = self.score(email)
+        if score is None:
+            return True
+
+        self.scored += 1
+        if score >= self.threshold or random.random() < self.explore_rate:
+            return True
+
+        self.calls_avoided += 1
+        print(f"Pre-classifier skipped email (score {score:.3f} < {self.threshold}): "
+              f"{email.get('subject', 'No subject')}")
+        return False
+
+    def record(self, email, actionable):
+        """Learn from a Claude decision and append it to the decisions log"""
+        features = email_features(email)
+        with self._lock:
+            self._learn(features, actionable)
+            try:
+                os.makedirs(os.path.dirname(self.decisions_file), exist_ok=True)
+                with open(self.decisions_file, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps({
+                        'id': email.get('id'),
+                        'features': features,
+                        'actionable': bool(actionable)
+                    }) + "\n")
+            except OSError as e:
+                print(f"ERROR recording pre-classifier decision: {e}")
+
+    def stats(self):
+        return {
+            'trained_on': sum(self.doc_counts),
+            'scored': self.scored,
+            'calls_avoided': self.calls_avoided
+        }
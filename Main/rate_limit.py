@@ -0,0 +1,81 @@
+import os
+import time
+import threading
+from datetime import datetime, timezone
+
+
+def _parse_reset(value):
+    """Seconds until an RFC 3339 rate-limit reset timestamp"""
+    try:
+        reset_at = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        return 0
+    return max(0.0, (reset_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class AnthropicRateLimiter:
+    """Pauses Claude calls across worker threads based on Anthropic rate-limit headers
+
+    Every response updates the gate from its anthropic-ratelimit-* headers. When the
+    remaining requests or tokens drop under the configured floor, or a 429 arrives,
+    all workers wait until the reported reset time instead of piling on more calls.
+    """
+
+    def __init__(self, min_requests=None, min_tokens=None):
+        if min_requests is None:
+            min_requests = int(os.getenv('ANTHROPIC_MIN_REMAINING_REQUESTS', '2'))
+        if min_tokens is None:
+            min_tokens = int(os.getenv('ANTHROPIC_MIN_REMAINING_TOKENS', '8000'))
+        self.min_requests = min_requests
+        self.min_tokens = min_tokens
+
+        self._resume_at = 0
+        self._lock = threading.Lock()
+        self.waits = 0
+        self.throttled = 0
+
+    def wait(self):
+        """Block until the gate is open"""
+        with self._lock:
+            delay = self._resume_at - time.time()
+        if delay > 0:
+            self.waits += 1
+            print(f"Anthropic rate limit reached, waiting {delay:.1f}s...")
+            time.sleep(delay)
+
+    def pause(self, seconds):
+        """Close the gate for the given number of seconds"""
+        with self._lock:
+            self._resume_at = max(self._resume_at, time.time() + seconds)
+
+    def update(self, headers):
+        """Update the gate from the headers of a successful response"""
+        requests_left = headers.get('anthropic-ratelimit-requests-remaining')
+        if requests_left is not None and int(requests_left) <= self.min_requests:
+            self.pause(_parse_reset(headers.get('anthropic-ratelimit-requests-reset')))
+
+        tokens_left = headers.get('anthropic-ratelimit-tokens-remaining')
+        if tokens_left is not None and int(tokens_left) <= self.min_tokens:
+            self.pause(_parse_reset(headers.get('anthropic-ratelimit-tokens-reset')))
+
+    def throttle(self, headers):
+        """Close the gate after a 429 response"""
+        self.throttled += 1
+        try:
+            retry_after = float(headers.get('retry-after', 0))
+        except (TypeError, ValueError):
+            retry_after = 0
+        self.pause(retry_after or 10)
+
+
+_shared_limiter = None
+_shared_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """Return the process-wide AnthropicRateLimiter"""
+    global _shared_limiter
+    with _shared_limiter_lock:
+        if _shared_limiter is None:
+            _shared_limiter = AnthropicRateLimiter()
+        return _shared_limiter
@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class MonitorJob:
+    """One periodically run monitor with its own cadence
+
+    The blocking check function runs in a worker thread so a slow source never
+    stalls the event loop or the other jobs. A job never overlaps with itself:
+    run_forever awaits each run before waiting for the next, and trigger() only
+    cuts that wait short.
+    """
+
+    def __init__(self, name, func, interval, jitter=0.0, max_backoff=None):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.jitter = jitter
+        self.max_backoff = max_backoff or max(interval * 10, 300)
+
+        self.runs = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.last_duration = 0.0
+
+        self._wakeup = None
+        self._loop = None
+
+    def trigger(self):
+        """Run the job as soon as it is free instead of waiting for the next tick
+
+        Safe to call from any thread.
+        """
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def _next_delay(self):
+        if self.consecutive_failures:
+            # Back off on a failing source without affecting the other jobs
+            delay = min(self.interval * (2 ** self.consecutive_failures), self.max_backoff)
+        else:
+            delay = self.interval
+        if self.jitter:
+            delay += random.uniform(0, self.jitter)
+        return delay
+
+    async def run_once(self):
+        """Run the check once in a worker thread, recording its outcome"""
+        started = time.monotonic()
+        try:
+            await asyncio.to_thread(self.func)
+            self.consecutive_failures = 0
+        except Exception as e:
+            self.failures += 1
+            self.consecutive_failures += 1
+            logger.error(f"[{self.name}] Error in monitoring job: {e}")
+        finally:
+            self.runs += 1
+            self.last_duration = time.monotonic() - started
+
+    async def run_forever(self):
+        self._wakeup = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+
+        # Spread the first runs so the monitors don't start in lockstep
+        if self.jitter:
+            await asyncio.sleep(random.uniform(0, self.jitter))
+
+        while True:
+            # Awaited to completion - the next run cannot start until this one is done
+            await self.run_once()
+
+            delay = self._next_delay()
+            logger.debug(f"[{self.name}] Run took {self.last_duration:.1f}s, next in {delay:.1f}s")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+
+class MonitorScheduler:
+    """Runs each MonitorJob as an independent asyncio task"""
+
+    def __init__(self):
+        self.jobs = []
+
+    def add_job(self, name, func, interval, jitter=0.0):
+        job = MonitorJob(name, func, interval, jitter)
+        self.jobs.append(job)
+        return job
+
+    async def run(self):
+        for job in self.jobs:
+            logger.info(f"Scheduling {job.name} every {job.interval}s (jitter up to {job.jitter}s)")
+        await asyncio.gather(*(job.run_forever() for job in self.jobs))
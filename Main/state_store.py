@@ -0,0 +1,38 @@
+import os
+import json
+
+
+def get_state_dir():
+    """Directory for files that must survive restarts (sync tokens, caches, ledgers)"""
+    default_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'state')
+    return os.getenv('STATE_DIR', default_dir)
+
+
+def state_path(filename):
+    """Return the path of a file in the state directory, creating the directory if needed"""
+    state_dir = get_state_dir()
+    os.makedirs(state_dir, exist_ok=True)
+    return os.path.join(state_dir, filename)
+
+
+def load_json(path, default=None):
+    """Load a JSON state file, returning default if it is missing or unreadable"""
+    if not os.path.exists(path):
+        return default
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Warning: Could not read state file {path}: {e}")
+        return default
+
+
+def save_json(path, data):
+    """Atomically write a JSON state file"""
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"ERROR saving state file {path}: {e}")
@@ -0,0 +1,62 @@
+import re
+import json
+
+ACTION_ITEMS_START_PATTERN = re.compile(r'"action_items"\s*:\s*\[')
+
+
+class ActionItemStreamParser:
+    """Incremental parser for the {"action_items": [...]} JSON Claude streams back
+
+    Text deltas are fed as they arrive; every array element is decoded as soon as
+    its closing brace has been received and returned from feed(). Elements parsed
+    before a truncated or malformed tail are kept in items.
+    """
+
+    def __init__(self):
+        self.buffer = ''
+        self.items = []
+        self.position = None  # Offset of the next array element, once the array has started
+        self.finished = False
+        self._decoder = json.JSONDecoder()
+
+    @property
+    def started(self):
+        return self.position is not None
+
+    def feed(self, text):
+        """Add a chunk of streamed text and return the items it completed"""
+        self.buffer += text
+        if self.finished:
+            return []
+
+        if self.position is None:
+            match = ACTION_ITEMS_START_PATTERN.search(self.buffer)
+            if not match:
+                return []
+            self.position = match.end()
+
+        completed = []
+        while True:
+            # Skip separators between elements
+            while self.position < len(self.buffer) and self.buffer[self.position] in ' \t\r\n,':
+                self.position += 1
+            if self.position >= len(self.buffer):
+                break
+            if self.buffer[self.position] == ']':
+                self.finished = True
+                break
+
+            # Nothing can be complete until a closing brace has arrived
+            if self.buffer.find('}', self.position) == -1:
+                break
+            try:
+                item, end = self._decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                # The element is still incomplete (or malformed) - wait for more text
+                break
+            self.position = end
+            if isinstance(item, dict):
+                completed.append(item)
+                self.items.append(item)
+
+        return completed
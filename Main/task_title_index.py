@@ -0,0 +1,80 @@
+import hashlib
+from state_store import state_path, load_json, save_json
+
+
+def normalize_title(title):
+    """Case- and whitespace-insensitive form of a task title used for duplicate checks"""
+    return ' '.join((title or '').lower().split())
+
+
+class TaskTitleIndex:
+    """Local index of the open task titles in one Microsoft To Do list
+
+    The index is persisted together with the list's Graph delta link, so each
+    sync only downloads tasks changed since the previous one. Tasks added locally
+    are not saved on their own - they are newer than the saved delta link, so the
+    next sync returns them again. Lookups are a dict access no matter how many
+    tasks the list holds.
+    """
+
+    def __init__(self, list_id):
+        self.list_id = list_id
+        list_key = hashlib.sha1(list_id.encode('utf-8')).hexdigest()[:16]
+        self.index_file = state_path(f"todo_title_index_{list_key}.json")
+
+        state = load_json(self.index_file, {})
+        if state.get('list_id') != list_id:
+            state = {}
+
+        # task id -> normalized title, for incomplete tasks only
+        self.tasks = state.get('tasks', {})
+        self.delta_link = state.get('delta_link')
+
+        self.title_counts = {}
+        for title in self.tasks.values():
+            self.title_counts[title] = self.title_counts.get(title, 0) + 1
+
+    def reset(self):
+        """Forget everything so the next sync starts from a full download"""
+        self.tasks = {}
+        self.title_counts = {}
+        self.delta_link = None
+
+    def _remove(self, task_id):
+        title = self.tasks.pop(task_id, None)
+        if title is not None:
+            self.title_counts[title] -= 1
+            if not self.title_counts[title]:
+                del self.title_counts[title]
+
+    def add(self, task_id, title):
+        """Record an open task"""
+        self._remove(task_id)
+        key = normalize_title(title)
+        self.tasks[task_id] = key
+        self.title_counts[key] = self.title_counts.get(key, 0) + 1
+
+    def apply_change(self, task):
+        """Apply one item from a tasks delta response"""
+        task_id = task.get('id')
+        if not task_id:
+            return
+        # Deleted and completed tasks no longer count as duplicates
+        if '@removed' in task or task.get('status') == 'completed':
+            self._remove(task_id)
+        elif 'title' in task:
+            self.add(task_id, task['title'])
+
+    def contains(self, title):
+        """Check whether an open task with this title exists"""
+        return normalize_title(title) in self.title_counts
+
+    def save(self):
+        save_json(self.index_file, {
+            'list_id': self.list_id,
+            'delta_link': self.delta_link,
+            'tasks': self.tasks
+        })
+
+    def __len__(self):
+        return len(self.tasks)
@@ -1,8 +1,21 @@
 import os
+import hashlib
+import sqlite3
+import threading
 from datetime import datetime
+from state_store import state_path
+
+def todo_fingerprint(todo):
+    """Normalized hash of a todo used for duplicate detection"""
+    text = todo.strip()
+    if text.startswith('- '):
+        text = text[2:]
+    normalized = ' '.join(text.lower().split())
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
 
 class TodoManager:
-    def __init__(self, todo_file_path=None, notes_file_path=None):
+    def __init__(self, todo_file_path=None, notes_file_path=None, index_file_path=None):
         if todo_file_path:
             self.todo_file = todo_file_path
         else:
@@ -12,6 +25,45 @@ class TodoManager:
             self.notes_file = notes_file_path
         else:
             self.notes_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'notes.txt')
+        
+        # SQLite index of todo fingerprints in the state directory, named after the todo file it describes
+        if index_file_path:
+            self.index_file = index_file_path
+        else:
+            self.index_file = state_path(os.path.splitext(os.path.basename(self.todo_file))[0] + '_index.sqlite3')
+        
+        self._index = None
+        self._index_lock = threading.Lock()
+    
+    def _get_index(self):
+        """Open the fingerprint index, importing existing todos.txt entries on first use"""
+        if self._index is not None:
+            return self._index
+        
+        os.makedirs(os.path.dirname(os.path.abspath(self.index_file)), exist_ok=True)
+        conn = sqlite3.connect(self.index_file, check_same_thread=False)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS todo_fingerprints ("
+            "fingerprint TEXT PRIMARY KEY, todo TEXT, source TEXT, created_at TEXT)"
+        )
+        conn.execute("CREATE TABLE IF NOT EXISTS index_meta (key TEXT PRIMARY KEY, value TEXT)")
+        
+        imported = conn.execute("SELECT value FROM index_meta WHERE key = 'imported_todo_file'").fetchone()
+        if not imported and os.path.exists(self.todo_file):
+            # One-time backfill so todos written before the index existed still count as duplicates
+            rows = []
+            with open(self.todo_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.startswith('- '):
+                        todo = line[2:].strip()
+                        rows.append((todo_fingerprint(todo), todo, 'todos.txt import', None))
+            conn.executemany("INSERT OR IGNORE INTO todo_fingerprints VALUES (?, ?, ?, ?)", rows)
+            print(f"Imported {len(rows)} existing todo(s) into {self.index_file}")
+        conn.execute("INSERT OR REPLACE INTO index_meta VALUES ('imported_todo_file', '1')")
+        conn.commit()
+        
+        self._index = conn
+        return conn
     
     def save_todos_to_file(self, todos, source_info):
         """Append todos to the todos.txt file with source information"""
@@ -22,32 +74,42 @@ class TodoManager:
             # Create the directory if it doesn't exist
             os.makedirs(os.path.dirname(self.todo_file), exist_ok=True)
             
-            # Read existing todos to avoid duplicates
-            existing_todos = set()
-            if os.path.exists(self.todo_file):
-                with open(self.todo_file, 'r', encoding='utf-8') as f:
-                    existing_todos = set(line.strip().lower() for line in f if line.strip())
+            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M')
             
-            # Append new todos
-            with open(self.todo_file, 'a', encoding='utf-8') as f:
-                timestamp = datetime.now().strftime('%Y-%m-%d %H:%M')
-                
-                f.write(f"\n--- {source_info} [{timestamp}] ---\n")
-                
-                new_count = 0
-                for todo in todos:
-                    # Simple duplicate check
-                    if todo.lower() not in existing_todos:
-                        f.write(f"- {todo}\n")
-                        existing_todos.add(todo.lower())
-                        new_count += 1
-                
-                f.write("\n")
-                
-                if new_count > 0:
-                    print(f"Saved {new_count} new todo(s) to {self.todo_file}")
-                else:
-                    print("No new todos to save (duplicates filtered)")
+            # Duplicate check against the fingerprint index - one keyed insert per todo
+            new_todos = []
+            with self._index_lock:
+                conn = self._get_index()
+                try:
+                    for todo in todos:
+                        cursor = conn.execute(
+                            "INSERT OR IGNORE INTO todo_fingerprints VALUES (?, ?, ?, ?)",
+                            (todo_fingerprint(todo), todo, source_info, timestamp)
+                        )
+                        if cursor.rowcount:
+                            new_todos.append(todo)
+                    
+                    # Keep writing todos.txt for anything that reads the plain-text file
+                    if new_todos:
+                        with open(self.todo_file, 'a', encoding='utf-8') as f:
+                            f.write(f"\n--- {source_info} [{timestamp}] ---\n")
+                            
+                            for todo in new_todos:
+                                f.write(f"- {todo}\n")
+                            
+                            f.write("\n")
+                    
+                    # Fingerprints only count once the todos are in the file
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+            
+            if not new_todos:
+                print("No new todos to save (duplicates filtered)")
+                return
+            
+            print(f"Saved {len(new_todos)} new todo(s) to {self.todo_file}")
                     
         except Exception as e:
             print(f"ERROR saving todos: {e}")
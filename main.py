@@ -10,7 +10,11 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'Main'))
 
 from email_monitor import EmailMonitor
 from fireflies_monitor import FirefliesMonitor
-import time
+from http_client import get_http_client
+from scheduler import MonitorScheduler
+from graph_webhook import GraphSubscriptionManager, NotificationReceiver
+import asyncio
+import queue
 import logging
 from datetime import datetime
 
@@ -30,42 +34,102 @@ def main():
     logger.info("Starting Email Todo Extractor...")
     
     try:
+        # One pooled HTTP client shared by every monitor
+        http_client = get_http_client()
+        
         # Initialize monitors
         logger.info("Initializing EmailMonitor...")
-        email_monitor = EmailMonitor()
+        email_monitor = EmailMonitor(http_client=http_client)
         logger.info("EmailMonitor initialized successfully")
         
         logger.info("Initializing FirefliesMonitor...")
-        fireflies_monitor = FirefliesMonitor()
+        fireflies_monitor = FirefliesMonitor(http_client=http_client)
         logger.info("FirefliesMonitor initialized successfully")
         
         logger.info("All monitors initialized successfully")
         logger.info(f"Monitoring email: {email_monitor.user_email}")
         
-        # Main monitoring loop
-        while True:
-            try:
-                # Check emails
-                email_monitor.check_new_emails()
-                
-                # Check Fireflies transcripts
-                fireflies_monitor.check_new_transcripts()
-                
-                # Wait before next check
-                logger.info(f"Waiting 30 seconds before next check...")
-                time.sleep(30)
-                
-            except KeyboardInterrupt:
-                logger.info("Monitoring stopped by user")
-                break
-            except Exception as e:
-                logger.error(f"Error in monitoring loop: {e}")
-                logger.info("Continuing after error...")
-                time.sleep(30)
-                
     except Exception as e:
         logger.error(f"Failed to initialize monitors: {e}")
         sys.exit(1)
+    
+    # Push mode: Graph notifies us of new mail, polling becomes a slow reconciliation pass
+    push_enabled = os.getenv('EMAIL_PUSH_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    notification_url = os.getenv('WEBHOOK_PUBLIC_URL')
+    if push_enabled and not notification_url:
+        logger.error("EMAIL_PUSH_ENABLED is set but WEBHOOK_PUBLIC_URL is missing - using polling only")
+        push_enabled = False
+    
+    # Each monitor runs on its own cadence, so a slow or failing source never delays the others
+    scheduler = MonitorScheduler()
+    if push_enabled:
+        email_interval = float(os.getenv('EMAIL_RECONCILE_INTERVAL', '600'))
+    else:
+        email_interval = float(os.getenv('EMAIL_POLL_INTERVAL', '30'))
+    scheduler.add_job(
+        "email",
+        email_monitor.check_new_emails,
+        interval=email_interval,
+        jitter=float(os.getenv('EMAIL_POLL_JITTER', '3'))
+    )
+    
+    if push_enabled:
+        pushed_ids = queue.Queue()
+        
+        def process_pushed_messages():
+            message_ids = []
+            while True:
+                try:
+                    message_ids.append(pushed_ids.get_nowait())
+                except queue.Empty:
+                    break
+            if message_ids:
+                email_monitor.process_message_ids(message_ids)
+        
+        push_job = scheduler.add_job("email-push", process_pushed_messages, interval=60)
+        
+        def on_message_ids(message_ids):
+            for message_id in message_ids:
+                pushed_ids.put(message_id)
+            push_job.trigger()
+        
+        subscriptions = GraphSubscriptionManager(
+            http_client, email_monitor.token_provider, email_monitor.user_email, notification_url
+        )
+        
+        # The receiver must be up before subscribing - Graph validates the URL synchronously
+        NotificationReceiver(subscriptions.client_state, on_message_ids).start()
+        scheduler.add_job("graph-subscription", subscriptions.ensure_subscription, interval=3600)
+        logger.info(f"Push mode enabled, notifications expected at {notification_url}")
+    
+    scheduler.add_job(
+        "fireflies",
+        fireflies_monitor.check_new_transcripts,
+        interval=float(os.getenv('FIREFLIES_POLL_INTERVAL', '600')),
+        jitter=float(os.getenv('FIREFLIES_POLL_JITTER', '60'))
+    )
+    
+    def log_stats():
+        # Token cache counters - misses should stay flat once the service is warm
+        logger.info(f"Graph token cache: {email_monitor.token_provider.stats()}")
+        logger.info(f"Email pre-classifier: {email_monitor.pre_classifier.stats()}")
+        logger.info(f"Email conversation context: {email_monitor.conversation_context.stats()}")
+        logger.info(f"Email extraction cache: {email_monitor.extraction_cache.stats()}")
+        logger.info(f"Email model routing: {email_monitor.router.stats()}")
+        logger.info(f"Email filter rule hits: {email_monitor.filter_rules.stats()}")
+        logger.info(f"Fireflies short-circuit: {fireflies_monitor.stats()}")
+        for job in scheduler.jobs:
+            logger.info(f"Job {job.name}: {job.runs} runs, {job.failures} failures, last run {job.last_duration:.1f}s")
+    
+    scheduler.add_job("stats", log_stats, interval=float(os.getenv('STATS_LOG_INTERVAL', '300')))
+    
+    # Finished ledger entries are only needed for LEDGER_RETENTION_DAYS
+    scheduler.add_job("ledger-prune", email_monitor.ledger.prune, interval=86400)
+    
+    try:
+        asyncio.run(scheduler.run())
+    except KeyboardInterrupt:
+        logger.info("Monitoring stopped by user")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
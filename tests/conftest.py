@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Modules under Main/ import each other by bare name, as main.py sets up
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Main'))
@@ -0,0 +1,36 @@
+from extraction_cache import content_key
+
+ORIGINAL = "Hi,\nPlease review the Contoso renewal terms by Friday.\nThanks, Priya"
+
+
+def test_outlook_forward_matches_original():
+    forward = (
+        "Can you take a look?\n"
+        "________________________________\n"
+        "From: Priya Natarajan <Priya@northwind.example>\n"
+        "Sent: Monday, October 12, 2026 9:14 AM\n"
+        "To: Alex Chen <alex@northwind.example>\n"
+        "Subject: Contoso renewal\n"
+        + ORIGINAL
+    )
+    assert (content_key('email', 'alex@northwind.example', 'FW: Contoso renewal', forward)
+            == content_key('email', 'priya@northwind.example', 'Contoso renewal', ORIGINAL))
+
+
+def test_gmail_forward_without_sender_matches_original():
+    forward = (
+        "---------- Forwarded message ---------\n"
+        "From: Priya Natarajan <priya@northwind.example>\n"
+        "Date: Mon, Oct 12, 2026 at 9:14 AM\n"
+        "Subject: Contoso renewal\n"
+        "To: <alex@northwind.example>\n"
+        + ORIGINAL
+    )
+    assert (content_key('forwarded', '', 'Fwd: Contoso renewal', forward)
+            == content_key('email', 'priya@northwind.example', 'Contoso renewal', ORIGINAL))
+
+
+def test_reply_keeps_sender_and_quoted_text():
+    reply = "Sounds good.\nFrom: Priya Natarajan <priya@northwind.example>\nSent: Monday\n" + ORIGINAL
+    assert (content_key('email', 'alex@northwind.example', 'RE: Contoso renewal', reply)
+            != content_key('email', 'priya@northwind.example', 'Contoso renewal', ORIGINAL))
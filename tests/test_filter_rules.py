@@ -0,0 +1,60 @@
+import pytest
+from filter_rules import FilterRuleEngine
+
+
+def make_email(subject='Quarterly plan', sender='jane@example.com', headers=None):
+    email = {'subject': subject, 'from': {'emailAddress': {'address': sender}}}
+    if headers is not None:
+        email['internetMessageHeaders'] = headers
+    return email
+
+
+@pytest.mark.parametrize('rule, email', [
+    (('subject', 'weekly digest'), make_email(subject='Your Weekly Digest is here')),
+    (('subject', r're:digest\s+#\d+'), make_email(subject='Digest #42')),
+    (('subject_prefix', 'accepted:'), make_email(subject='Accepted: Planning')),
+    (('subject_prefix', r're:(?:declined|canceled):'), make_email(subject='Canceled: Planning')),
+    (('sender', 'noreply'), make_email(sender='noreply@example.com')),
+    (('sender', r're:^bot\d+@'), make_email(sender='bot7@example.com')),
+    (('domain', 'x.com'), make_email(sender='jane@x.com')),
+    (('domain', 'x.com'), make_email(sender='jane@mail.x.com')),
+    (('domain', r're:x\.com'), make_email(sender='jane@x.com')),
+    (('domain', r're:x\.com'), make_email(sender='jane@mail.x.com')),
+    (('header', 'list-unsubscribe:'), make_email(headers=[{'name': 'List-Unsubscribe', 'value': '<mailto:u@x.com>'}])),
+    (('header', r're:precedence: (?:bulk|list)'), make_email(headers=[{'name': 'Precedence', 'value': 'bulk'}])),
+    (('any', 'newsletter'), make_email(subject='The Newsletter')),
+    (('any', 'newsletter'), make_email(sender='newsletter@example.com')),
+    (('any', r're:promo(?:tion)?s?\b'), make_email(subject='Spring promotions')),
+])
+def test_match_returns_rule_and_counts_hit(rule, email):
+    engine = FilterRuleEngine(rules=[('subject', 'unrelated'), rule])
+    assert engine.match(email) == rule
+    assert engine.hits == [0, 1]
+
+
+@pytest.mark.parametrize('rule, email', [
+    (('subject', 'weekly digest'), make_email(subject='Weekly plan')),
+    (('subject_prefix', 'accepted:'), make_email(subject='Re: Accepted: Planning')),
+    (('sender', r're:^bot\d+@'), make_email(sender='robot@example.com')),
+    (('domain', 'x.com'), make_email(sender='jane@box.com')),
+    (('domain', r're:x\.com'), make_email(sender='jane@box.com')),
+    (('header', 'list-unsubscribe:'), make_email()),
+    (('any', 'newsletter'), make_email()),
+])
+def test_match_ignores_non_matching_email(rule, email):
+    engine = FilterRuleEngine(rules=[rule])
+    assert engine.match(email) is None
+    assert engine.hits == [0]
+
+
+def test_stats_ranks_rules_by_hits():
+    engine = FilterRuleEngine(rules=[('domain', r're:x\.com'), ('subject', 'digest')])
+    engine.match(make_email(sender='a@x.com'))
+    engine.match(make_email(sender='b@x.com'))
+    engine.match(make_email(subject='Digest'))
+    assert engine.stats() == {r'domain: re:x\.com': 2, 'subject: digest': 1}
+
+
+def test_uses_headers_only_with_header_rules():
+    assert not FilterRuleEngine(rules=[('subject', 'digest'), ('any', 'promo')]).uses_headers
+    assert FilterRuleEngine(rules=[('subject', 'digest'), ('header', 'precedence: bulk')]).uses_headers